@@ -1,38 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import matplotlib.pyplot as plt
 import pandas as pd
+import scipy.sparse as sp
 
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
-
+from src.utils.cluster_table import LABEL_COLUMN, PARTITION_COLUMN, stack_partitions
 from src.utils.helpers import drop_nans, get_total_awards_or_nominations
-from src.data import load_awards, load_nominations
-from scipy.stats import spearmanr, pearsonr
+from src.utils.figures import FigureSpec
+from src.utils.lazy import LazyModule
+from src.data import load_awards, load_movie_awards, load_movie_nominations, load_nominations
 
+plt = LazyModule("matplotlib.pyplot")
+linear_model = LazyModule("sklearn.linear_model")
+metrics = LazyModule("sklearn.metrics")
+stats = LazyModule("scipy.stats")
 
-def get_community_awards_statistics(communities, actor_awards):
-    community_awards = {}
-    for community_id, community_members in enumerate(communities):
-        community_actors = actor_awards[actor_awards['FreebaseActorId'].isin(community_members)]
-        total_awards_in_community = community_actors['TotalAwards'].sum()
-        awarded_actors_in_community = len(community_actors[community_actors['TotalAwards'] > 0])
-        total_actors_in_community = len(community_actors)
-
-        community_awards[community_id] = {
-            "total_actors": total_actors_in_community,
-            "awarded_actors": awarded_actors_in_community,
-            "total_awards": total_awards_in_community,
-            "award_density": awarded_actors_in_community / total_actors_in_community if total_actors_in_community > 0 else 0,
-        }
 
-    community_sizes = [metrics['total_actors'] for metrics in community_awards.values()]
-    award_densities = [metrics['award_density'] for metrics in community_awards.values()]
+def community_awards_table(partitions, actor_awards):
+    """
+    Computes the award statistics of every community of one or several
+    partitions with one join of the community labels onto the awards table
+    and one groupby over (partition, label).
+
+    Parameters
+    ----------
+    partitions : dict or list
+        Partitions keyed by e.g. seed or resolution, see `cluster_table.stack_partitions`.
+    actor_awards : DataFrame
+        Awards table with columns "FreebaseActorId" and "TotalAwards"
+
+    Returns
+    -------
+    DataFrame
+        Indexed by (Partition, ClusterLabel), with columns "TotalActors"
+        (actors of the community in the awards table), "AwardedActors",
+        "TotalAwards" and "AwardDensity" (AwardedActors / TotalActors, 0 for
+        communities without actors in the awards table).
+    """
+    members, clusters = stack_partitions(partitions)
+    awards = members.merge(actor_awards[["FreebaseActorId", "TotalAwards"]], on="FreebaseActorId")
+    awards["Awarded"] = awards["TotalAwards"] > 0
+    table = awards.groupby([PARTITION_COLUMN, LABEL_COLUMN]).agg(
+        TotalActors=("FreebaseActorId", "size"),
+        AwardedActors=("Awarded", "sum"),
+        TotalAwards=("TotalAwards", "sum"),
+    ).reindex(clusters, fill_value=0)
+    total_actors = table["TotalActors"].to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        table["AwardDensity"] = np.where(total_actors > 0, table["AwardedActors"].to_numpy() / total_actors, 0.0)
+    return table
 
-    high_award_density_clusters = [cid for cid, metrics in community_awards.items() if metrics['award_density'] > 0.8]
-    low_award_density_clusters = [cid for cid, metrics in community_awards.items() if metrics['award_density'] < 0.2]
 
-    print(f"Clusters with high award density (>80%): {len(high_award_density_clusters)}")
-    print(f"Clusters with low award density (<20%): {len(low_award_density_clusters)}")
+def get_community_awards_statistics(communities, actor_awards):
+    table = community_awards_table([communities], actor_awards).droplevel(PARTITION_COLUMN)
+    community_sizes = table["TotalActors"].tolist()
+    award_densities = table["AwardDensity"].tolist()
+
+    print(f"Clusters with high award density (>80%): {(table['AwardDensity'] > 0.8).sum()}")
+    print(f"Clusters with low award density (<20%): {(table['AwardDensity'] < 0.2).sum()}")
 
     average_award_density = np.mean(award_densities)
     print(f"Average award density across communities: {average_award_density:.2%}")
@@ -49,11 +75,11 @@ def get_linreg_q1(community_sizes, award_densities, boundary):
 
     pos_indexes = log_community_sizes > np.log(boundary)
 
-    model = LinearRegression()
+    model = linear_model.LinearRegression()
     model.fit(X[pos_indexes], y[pos_indexes])
 
     predicted_award_densities = model.predict(X)
-    r_squared = r2_score(y[pos_indexes], predicted_award_densities[pos_indexes])
+    r_squared = metrics.r2_score(y[pos_indexes], predicted_award_densities[pos_indexes])
 
     print(f"R2 score for the linreg fit: {r_squared}")
     return predicted_award_densities
@@ -62,6 +88,11 @@ def get_linreg_q1(community_sizes, award_densities, boundary):
 def plot_community_awards_statistics(communities, actor_awards, boundary=20):
     community_sizes, award_densities = get_community_awards_statistics(communities,
                                                                         actor_awards)
+    draw_community_awards_statistics(community_sizes, award_densities, boundary)
+    plt.show()
+
+
+def draw_community_awards_statistics(community_sizes, award_densities, boundary=20):
     predicted_award_densities = get_linreg_q1(community_sizes, award_densities, boundary)
     community_sizes = np.array(community_sizes)
     fig, axes = plt.subplots(1, 2, figsize=(12, 6))
@@ -82,7 +113,12 @@ def plot_community_awards_statistics(communities, actor_awards, boundary=20):
     axes[1].grid(axis="x", linestyle="--", alpha=0.7)
 
     fig.tight_layout()
-    plt.show()
+
+
+def community_awards_figure_spec(communities, actor_awards, boundary=20, name="community_awards"):
+    """FigureSpec of `plot_community_awards_statistics`, for `figures.export_figures`."""
+    community_sizes, award_densities = get_community_awards_statistics(communities, actor_awards)
+    return FigureSpec(name, draw_community_awards_statistics, (community_sizes, award_densities, boundary))
 
 
 def load_awards_and_nominations():
@@ -118,33 +154,184 @@ def load_awards_and_nominations():
     return actor_awards, actor_nominations, actor_full_awards
 
 
-def compute_cluster_metrics_actors(communities, movies, characters_movies, actor_metrics):
+def load_movie_awards_and_nominations():
+    """
+    Loads the movie-level awards and nominations and counts them per movie.
+
+    Returns
+    -------
+    DataFrame
+        Columns "FreebaseId", "Awards", "TotalAwards", "Nominations" and
+        "TotalNominations", one row per movie.
+    """
+    movie_awards = load_movie_awards()
+    movie_awards["TotalAwards"] = get_total_awards_or_nominations(movie_awards, total_type="Awards")
+    movie_nominations = load_movie_nominations()
+    movie_nominations["TotalNominations"] = get_total_awards_or_nominations(movie_nominations, total_type="Nominations")
+
+    movie_full_awards = pd.merge(movie_awards, movie_nominations, how="outer", on="FreebaseId")
+    for column in ["TotalAwards", "TotalNominations"]:
+        movie_full_awards[column] = movie_full_awards[column].fillna(0).astype(np.int64)
+    return movie_full_awards
+
+
+_worker_engine = None
+
+
+def _init_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+
+def _batch_table(partitions):
+    return _worker_engine.batch_table(partitions)
+
+
+class ClusterAwardMetrics:
+    """
+    Computes the revenue and the award totals of the clusters of any number
+    of partitions. Movie revenues and award counts are stored once as vectors
+    over the movie IDs and actor awards as one row per actor; a batch of
+    partitions is joined onto the roles by actor label, and the products of
+    the resulting sparse clusters x movies matrix with the movie vectors give
+    all the per-cluster totals at once.
+    """
+
+    def __init__(self, movies, characters_movies, actor_metrics, movie_awards=None):
+        """
+        Creates a ClusterAwardMetrics object.
+
+        Parameters
+        ----------
+        movies : pd.DataFrame
+            Pre-processed table with movies metadata, revenues are summed over its rows
+        characters_movies : pd.DataFrame
+            Merged movies and characters table, links the actors to their movies
+        actor_metrics : pd.DataFrame
+            Actor awards with columns "FreebaseActorId", "TotalAwards" and
+            optionally "TotalNominations", see `load_awards_and_nominations`
+        movie_awards : pd.DataFrame, optional
+            Movie awards with columns "FreebaseId", "TotalAwards" and
+            "TotalNominations", see `load_movie_awards_and_nominations`.
+        """
+        self.movie_ids = pd.Index(movies["FreebaseId"].unique())
+        codes = self.movie_ids.get_indexer(movies["FreebaseId"])
+        revenues = movies["Revenue"].fillna(0).to_numpy(dtype=np.float64)
+        self.movie_values = pd.DataFrame(
+            {"Revenue": np.bincount(codes, weights=revenues, minlength=len(self.movie_ids))},
+            index=self.movie_ids,
+        )
+        if movie_awards is not None:
+            totals = movie_awards.groupby("FreebaseId")[["TotalAwards", "TotalNominations"]].sum()
+            totals = totals.reindex(self.movie_ids, fill_value=0)
+            self.movie_values["MovieAwards"] = totals["TotalAwards"].to_numpy()
+            self.movie_values["MovieNominations"] = totals["TotalNominations"].to_numpy()
+
+        roles = pd.DataFrame({
+            "FreebaseActorId": characters_movies["FreebaseActorId"].to_numpy(),
+            "MovieCode": self.movie_ids.get_indexer(characters_movies["FreebaseId"]),
+        })
+        self.roles = roles[roles["MovieCode"] >= 0].drop_duplicates(ignore_index=True)
+
+        columns = {"TotalAwards": "ActorAwards", "TotalNominations": "ActorNominations"}
+        self.actor_values = actor_metrics.groupby("FreebaseActorId")[
+            [column for column in columns if column in actor_metrics]
+        ].sum().rename(columns=columns)
+
+    def batch_table(self, partitions):
+        """
+        Computes the metrics of all the clusters of a batch of partitions in
+        the current process, see `table`.
+        """
+        members, clusters = stack_partitions(partitions)
+        n_clusters = len(clusters)
+        rows = clusters.get_indexer(pd.MultiIndex.from_frame(members[[PARTITION_COLUMN, LABEL_COLUMN]]))
+        members = pd.DataFrame({"Row": rows, "FreebaseActorId": members["FreebaseActorId"].to_numpy()})
+
+        pairs = members.merge(self.roles, on="FreebaseActorId")
+        membership = sp.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int64), (pairs["Row"].to_numpy(), pairs["MovieCode"].to_numpy())),
+            shape=(n_clusters, len(self.movie_ids)),
+        )
+        membership.sum_duplicates()
+        membership.data[:] = 1
+
+        table = pd.DataFrame({
+            "NumActors": np.bincount(rows, minlength=n_clusters),
+            "NumMovies": np.diff(membership.indptr).astype(np.int64),
+        }, index=clusters)
+        for column in self.movie_values:
+            table[column] = membership @ self.movie_values[column].to_numpy()
+
+        actor_totals = members.merge(self.actor_values, left_on="FreebaseActorId", right_index=True)
+        actor_totals = actor_totals.groupby("Row")[list(self.actor_values.columns)].sum()
+        actor_totals = actor_totals.reindex(pd.RangeIndex(n_clusters), fill_value=0)
+        for column in self.actor_values:
+            table[column] = actor_totals[column].to_numpy()
+        return table
+
+    def table(self, partitions, n_jobs=None):
+        """
+        Computes the metrics of all the clusters of one or several partitions,
+        the partitions being split in batches between worker processes.
+
+        Parameters
+        ----------
+        partitions : dict or list
+            Partitions keyed by e.g. seed or resolution, see `cluster_table.stack_partitions`.
+        n_jobs : int, optional
+            Number of worker processes. If 1, or with a single partition, all the
+            partitions are processed in one batch in the current process.
+            Defaults to the number of CPUs.
+
+        Returns
+        -------
+        DataFrame
+            Indexed by (Partition, ClusterLabel), with columns:
+            - "NumActors": number of distinct actors.
+            - "NumMovies": number of movies where at least one actor of the cluster played.
+            - "Revenue": total revenue of these movies.
+            - "MovieAwards", "MovieNominations": total awards and nominations of
+              these movies (only if `movie_awards` was given).
+            - "ActorAwards", "ActorNominations": total awards and nominations
+              of the actors (the columns present in `actor_metrics`).
+        """
+        items = list(partitions.items() if isinstance(partitions, dict) else enumerate(partitions))
+        if n_jobs == 1 or len(items) <= 1:
+            return self.batch_table(dict(items))
+
+        n_batches = min(n_jobs or os.cpu_count(), len(items))
+        batches = [dict(items[i] for i in batch) for batch in np.array_split(np.arange(len(items)), n_batches)]
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(self,)) as executor:
+            tables = list(executor.map(_batch_table, batches))
+        return pd.concat(tables)
+
+
+def compute_cluster_metrics_actors(communities, movies, characters_movies, actor_metrics, movie_awards=None):
     """
     Compute metrics for each community based on actor-level data:
     - Total revenue
     - Total actor awards and nominations
     - Number of actors in the community
+    - Total movie awards and nominations, if `movie_awards` is given
+      (see `load_movie_awards_and_nominations`)
     """
-    cluster_metrics = {}
+    engine = ClusterAwardMetrics(movies, characters_movies, actor_metrics, movie_awards)
+    table = engine.table([communities], n_jobs=1).droplevel(PARTITION_COLUMN)
+    revenues = table["Revenue"].to_numpy() / 1_000_000_000
+    # here TotalAwards is awards+nominations
+    actor_awards = table["ActorAwards"].to_numpy()
 
+    cluster_metrics = {}
     for community_id, community_members in enumerate(communities):
-        # Filter the actor for community
-        community_actor_metrics = actor_metrics[actor_metrics.FreebaseActorId.isin(community_members)]
-
-        # Calculate total awards/nominations
-        # here TotalAwards is awards+nominations
-        total_actor_awards = community_actor_metrics['TotalAwards'].sum()
-
-        # Calculate total revenue based on movies
-        community_movie_ids = characters_movies[characters_movies.FreebaseActorId.isin(community_members)].FreebaseId.unique()
-        total_revenue = movies[movies.FreebaseId.isin(community_movie_ids)]['Revenue'].sum()
-        total_revenue_in_billions = total_revenue / 1_000_000_000
-
         cluster_metrics[community_id] = {
-            "total_revenue": float(f"{total_revenue_in_billions:.5f}"),
-            "total_actor_awards": total_actor_awards,
+            "total_revenue": float(f"{revenues[community_id]:.5f}"),
+            "total_actor_awards": actor_awards[community_id],
             "num_actors": len(community_members)
         }
+        if movie_awards is not None:
+            cluster_metrics[community_id]["total_movie_awards"] = table["MovieAwards"].iat[community_id]
+            cluster_metrics[community_id]["total_movie_nominations"] = table["MovieNominations"].iat[community_id]
 
     return cluster_metrics
 
@@ -154,11 +341,11 @@ def get_linreg_q3(total_awards, total_revenue):
     X = np.array(total_awards).reshape(-1, 1)
     y = total_revenue
 
-    model = LinearRegression()
+    model = linear_model.LinearRegression()
     model.fit(X, y)
 
     predicted_revenue = model.predict(X)
-    r_squared = r2_score(y, predicted_revenue)
+    r_squared = metrics.r2_score(y, predicted_revenue)
 
     print(f"R2 score for the linreg fit: {r_squared}")
     return predicted_revenue
@@ -193,5 +380,5 @@ def plot_actors_award_nominations_revenue(communities, movies, characters_movies
     plt.show()
 
 
-    print("Spearman correlation:", spearmanr(total_actor_awards, total_revenues_actors))
-    print("Pearson correlation:", pearsonr(total_actor_awards, total_revenues_actors))
\ No newline at end of file
+    print("Spearman correlation:", stats.spearmanr(total_actor_awards, total_revenues_actors))
+    print("Pearson correlation:", stats.pearsonr(total_actor_awards, total_revenues_actors))
\ No newline at end of file
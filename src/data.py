@@ -3,7 +3,6 @@ import shutil
 from pathlib import Path
 
 import pandas as pd
-import wget
 
 from src.utils.helpers import (
     filter_by_country, 
@@ -13,6 +12,9 @@ from src.utils.helpers import (
     filter_by_language,
     create_graph_from_data
 )
+from src.utils.lazy import LazyModule
+
+wget = LazyModule("wget")
 
 URL = {
     "dataset": "http://www.cs.cmu.edu/~ark/personas/data/MovieSummaries.tar.gz",
@@ -68,6 +70,32 @@ def load_nominations():
     return nominations
 
 
+def load_movie_awards():
+    """
+    Load the movie-level awards dataset.
+    Assumes the awards data contains 'FreebaseId' and 'Awards' columns.
+
+    Returns:
+    - DataFrame: Pandas DataFrame containing the awards of each movie.
+    """
+    awards = pd.read_csv(AWARD_PATH / "awards_movies.tsv", sep="\t", index_col=0)
+    awards.columns = ["FreebaseId", "Awards"]
+    return awards
+
+
+def load_movie_nominations():
+    """
+    Load the movie-level nominations dataset.
+    Assumes the nominations data contains 'FreebaseId' and 'Nominations' columns.
+
+    Returns:
+    - DataFrame: Pandas DataFrame containing the nominations of each movie.
+    """
+    nominations = pd.read_csv(AWARD_PATH / "nominations_movies.tsv", sep="\t", index_col=0)
+    nominations.columns = ["FreebaseId", "Nominations"]
+    return nominations
+
+
 def load_plots():
     """Returns a pandas DataFrame containing plot summaries."""
     plots = pd.read_csv(
@@ -0,0 +1,96 @@
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_PATH = Path(__file__).absolute().resolve().parent.parent.parent
+
+MODULES = [
+    "src.data",
+    "src.awards.helpers",
+    "src.utils.actors",
+    "src.utils.centrality",
+    "src.utils.cluster_table",
+    "src.utils.csr_graph",
+    "src.utils.editable_partition",
+    "src.utils.figures",
+    "src.utils.genres",
+    "src.utils.graphs",
+    "src.utils.helpers",
+    "src.utils.hierarchy",
+    "src.utils.indexes",
+    "src.utils.layout",
+    "src.utils.networkx_helpers",
+    "src.utils.partition_metrics",
+    "src.utils.raster",
+    "src.utils.sketches",
+    "src.utils.q_4_5.helpers",
+    "src.utils.q_6.helpers",
+]
+
+# dependencies only loaded on first use (see `src.utils.lazy.LazyModule`)
+LAZY_DEPENDENCIES = ["matplotlib", "seaborn", "community", "sklearn", "wget", "scipy.stats"]
+
+# seconds, for a module and everything it imports, in a fresh interpreter
+THRESHOLD = 1.0
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module):
+    """
+    Imports a module in a fresh interpreter, so that nothing is already cached.
+
+    Parameters
+    ----------
+    module : str
+        Absolute name of the module
+
+    Returns
+    -------
+    dict
+        "seconds": import time, "loaded": lazy dependencies imported along the module.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE.format(module=module, lazy=LAZY_DEPENDENCIES)],
+        cwd=ROOT_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Checks the import time of each module and that heavy dependencies are imported lazily."
+    )
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="maximum import time in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="measures per module, the best one is kept")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="modules to check (default: all)")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        measures = [measure_import(module) for _ in range(args.repeat)]
+        seconds = min(measure["seconds"] for measure in measures)
+        loaded = measures[0]["loaded"]
+        ok = seconds <= args.threshold and not loaded
+        print(f"{'ok  ' if ok else 'FAIL'} {module:<32} {seconds:6.3f}s" + (f"  loads {', '.join(loaded)}" if loaded else ""))
+        if not ok:
+            failures.append(module)
+
+    if failures:
+        print(f"{len(failures)} module(s) over {args.threshold}s or loading a lazy dependency: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,45 @@
 import ast
 from collections import Counter
 
-import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
+import scipy.sparse as sp
 
 from ..data import load_characters, load_movies
-from ..utils.helpers import merge_movies_and_actors
+from ..utils.cluster_table import ClusterTable
+from ..utils.figures import FigureSpec
+from ..utils.genres import GenreMatrix
+from ..utils.indexes import ActorIndex
+from ..utils.lazy import LazyModule
+
+plt = LazyModule("matplotlib.pyplot")
+
+
+def draw_cluster_genders(female_percent, male_percent, title="Gender proportions in this actor group"):
+    plt.pie(
+        [female_percent, male_percent],
+        labels=["Female", "Male"],
+        autopct="%1.1f%%",
+    )
+    plt.title(title)
+
+
+def draw_cluster_ages(ages, title="Age at release distribution in this actor group"):
+    plt.hist(ages)
+    plt.title(title)
+    plt.xlabel("Age at release")
+    plt.ylabel("Count")
+
+
+def draw_cluster_genres(genres):
+    num_values = min(len(genres), 20)  # keep only 20 first genres for readability
+    y = np.arange(num_values)
+    figure = plt.figure(figsize=(10, 5))
+    plt.barh(y, list(genres.values())[:num_values][::-1])
+    plt.yticks(y, list(genres.keys())[:num_values][::-1], fontsize=8)
+    plt.title("Genre distribution in this actor group")
+    plt.xlabel("Movie count")
+    plt.ylabel("Genre")
 
 
 class ActorStats:
@@ -13,6 +47,8 @@ class ActorStats:
     Gives access to various functions about actors.
     """
 
+    __slots__ = ("characters", "movies", "_index", "_genre_matrix")
+
     def __init__(self, characters, movies):
         """
         Creates an ActorStats object.
@@ -26,6 +62,22 @@ class ActorStats:
         """
         self.characters = characters
         self.movies = movies
+        self._index = None
+        self._genre_matrix = None
+
+    @property
+    def index(self):
+        """ActorIndex over `characters` and `movies`, built on first lookup."""
+        if self._index is None:
+            self._index = ActorIndex(self.characters, self.movies)
+        return self._index
+
+    @property
+    def genre_matrix(self):
+        """GenreMatrix of `movies`, built on first access."""
+        if self._genre_matrix is None:
+            self._genre_matrix = GenreMatrix(self.movies)
+        return self._genre_matrix
 
     def actor_name(self, actor_id):
         """
@@ -41,9 +93,7 @@ class ActorStats:
         str
             actor name corresponding to actor ID
         """
-        return self.characters[self.characters["FreebaseActorId"] == actor_id].iloc[0][
-            "ActorName"
-        ]
+        return self.index.actors["ActorName"].iat[self.index.actor_codes[actor_id]]
 
     def actor_movie_ids(self, actor_id):
         """
@@ -60,9 +110,7 @@ class ActorStats:
             a list of all movie ids that the actor played in
         """
         return (
-            self.characters[self.characters["FreebaseActorId"] == actor_id][
-                "WikipediaId"
-            ]
+            self.characters["WikipediaId"].iloc[self.index.roles(actor_id)]
             .dropna()
             .to_list()
         )
@@ -81,8 +129,7 @@ class ActorStats:
         DataFrame
             a DataFrame containing metadata of all movies that the actor played in
         """
-        movie_ids = self.actor_movie_ids(actor_id)
-        return self.movies[self.movies["WikipediaId"].isin(movie_ids)]
+        return self.movies.iloc[self.index.movies(actor_id)]
 
     def actor_movie_names(self, actor_id):
         """
@@ -206,22 +253,138 @@ class ActorStats:
             f"  * Average movie revenue: {self.actor_mean_revenue(actor_id):15,.0f}$."
         )
 
+    def actor_summary(self, actor_ids=None, top_k=3, actor_awards=None, actor_nominations=None):
+        """
+        Computes the statistics of many actors at once, with one groupby over
+        the actor-movie pairs and one sparse product for the genres.
+
+        Parameters
+        ----------
+        actor_ids : list, optional
+            Freebase actor IDs to summarize. Defaults to all the actors in `characters`.
+        top_k : int, optional
+            Number of preferred genres to keep. Defaults to 3.
+        actor_awards : DataFrame, optional
+            Table with 'FreebaseActorId' and 'TotalAwards' columns, see
+            `load_awards_and_nominations`. If given, a "TotalAwards" column is added.
+        actor_nominations : DataFrame, optional
+            Table with 'FreebaseActorId' and 'TotalNominations' columns. If given,
+            a "TotalNominations" column is added.
+
+        Returns
+        -------
+        DataFrame
+            Indexed by Freebase actor ID, with columns "ActorName", "MovieCount",
+            "TotalRevenue", "MeanRevenue", "FirstYear", "LastYear", "CareerSpan"
+            and "TopGenres" (list of name-count pairs, as `actor_prefered_genres`).
+        """
+        index = self.index
+        actors = index.actor_ids if actor_ids is None else pd.Index(actor_ids)
+        actor_codes = index.codes(actors)
+
+        # map the code of each role to its position in `actors`
+        known = actor_codes >= 0
+        positions = np.full(len(index.actor_ids) + 1, -1)
+        positions[actor_codes[known]] = np.flatnonzero(known)
+        codes = positions[index.role_codes]
+        rows = self.genre_matrix.movie_rows(self.characters["WikipediaId"])
+        found = (codes >= 0) & (rows >= 0)
+        pairs = pd.DataFrame({"Actor": codes[found], "Movie": rows[found]}).drop_duplicates()
+        pairs["Revenue"] = self.movies["Revenue"].to_numpy()[pairs["Movie"]]
+        release_dates = pd.to_datetime(self.movies["ReleaseDate"], format="mixed", errors="coerce")
+        pairs["Year"] = release_dates.dt.year.to_numpy()[pairs["Movie"]]
+
+        summary = pairs.groupby("Actor").agg(
+            MovieCount=("Movie", "size"),
+            TotalRevenue=("Revenue", "sum"),
+            MeanRevenue=("Revenue", "mean"),
+            FirstYear=("Year", "min"),
+            LastYear=("Year", "max"),
+        ).reindex(np.arange(len(actors)))
+        summary["MovieCount"] = summary["MovieCount"].fillna(0).astype(int)
+        summary["TotalRevenue"] = summary["TotalRevenue"].fillna(0)
+        summary["CareerSpan"] = summary["LastYear"] - summary["FirstYear"]
+
+        membership = sp.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int64), (pairs["Actor"], pairs["Movie"])),
+            shape=(len(actors), len(self.movies)),
+        )
+        _, genres, counts, offsets = self.genre_matrix.ranked_genres(membership)
+        genre_names = self.genre_matrix.genres[genres].tolist()
+        counts = counts.tolist()
+        ends = np.minimum(offsets[:-1] + top_k, offsets[1:])
+        summary["TopGenres"] = [
+            list(zip(genre_names[start:end], counts[start:end]))
+            for start, end in zip(offsets[:-1], ends)
+        ]
+
+        summary.index = actors.rename("FreebaseActorId")
+        names = index.actors["ActorName"].to_numpy()[actor_codes]
+        summary.insert(0, "ActorName", np.where(known, names, None))
+        if actor_awards is not None:
+            awards = actor_awards.groupby("FreebaseActorId")["TotalAwards"].sum()
+            summary["TotalAwards"] = awards.reindex(actors, fill_value=0).to_numpy()
+        if actor_nominations is not None:
+            nominations = actor_nominations.groupby("FreebaseActorId")["TotalNominations"].sum()
+            summary["TotalNominations"] = nominations.reindex(actors, fill_value=0).to_numpy()
+        return summary
+
 
 class Cluster(ActorStats):
     """
     A cluster contains a list of actors and offers various functions to
     compute and plot specific statistics about it.
+
+    A cluster only stores its actor IDs and its label in a shared ClusterTable.
+    Derived statistics are computed on first access and cached, call
+    `invalidate` if the underlying tables are modified.
     """
 
-    def __init__(self, characters, movies, actor_ids):
+    __slots__ = ("actor_ids", "table", "label", "_cache")
+
+    def __init__(self, characters, movies, actor_ids, table=None, label=0):
         """
         Creates a cluster given a list of Freebase actor IDs (as strings).
+
+        Parameters
+        ----------
+        table: ClusterTable, optional
+            Table of the whole partition this cluster belongs to. If None, a
+            table containing only this cluster is built.
+        label: int, optional
+            Index of this cluster in `table`. Defaults to 0.
         """
         super().__init__(characters, movies)
         self.actor_ids = actor_ids
-        self.movies_and_actors = merge_movies_and_actors(
-            self.movies, characters[characters["FreebaseActorId"].isin(actor_ids)]
-        )
+        if table is None:
+            table = ClusterTable(characters, movies, [actor_ids])
+        self.table = table
+        self.label = label
+        self._cache = {}
+
+    def _cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def invalidate(self):
+        """Drops all the cached statistics of the cluster."""
+        self._cache.clear()
+
+    @property
+    def index(self):
+        """ActorIndex shared by all the clusters of the table."""
+        return self.table.actor_index
+
+    @property
+    def genre_matrix(self):
+        """GenreMatrix shared by all the clusters of the table."""
+        return self.table.genre_matrix
+
+    @property
+    def movies_and_actors(self):
+        """Merged movies and characters metadata of the actors in the cluster."""
+        return self.table.cluster_frame(self.label)
 
     def __str__(self):
         """
@@ -243,42 +406,54 @@ class Cluster(ActorStats):
         float64
             The mean revenue for the specified cluster.
         """
-        return self.movies_and_actors.groupby("FreebaseActorId").Revenue.mean().mean()
+        return self._cached(
+            "mean_revenue",
+            lambda: self.movies_and_actors.groupby("FreebaseActorId").Revenue.mean().mean(),
+        )
 
-    def cluster_median_revenue(self):
+    def cluster_median_revenue(self, approximate=False, k=200):
         """
         Gets median revenue generated by the actors in the cluster.
 
+        Parameters
+        ----------
+        approximate : bool, optional
+            If True, the median is read from the cluster's KLL sketch, see
+            `ClusterTable.median_revenue_sketches`. Defaults to False.
+        k : int, optional
+            Size parameter of the sketches. Defaults to 200.
+
         Returns
         -------
         float64
             The median revenue for the specified cluster.
         """
-        return self.movies_and_actors.groupby("FreebaseActorId").Revenue.median().median()
+        if approximate:
+            return self.table.median_revenue_sketches(k)[self.label].median()
+        return self._cached(
+            "median_revenue",
+            lambda: self.movies_and_actors.groupby("FreebaseActorId").Revenue.median().median(),
+        )
 
     def cluster_movies(self, select_type="any", num_actors_in_movie=None):
         """
-        Gets all the movies where at least one actor of the cluster played in.
+        Gets all the movies assigned to the cluster, by default the ones where
+        at least one actor of the cluster played in.
+
+        Parameters
+        ----------
+        select_type : str or float, optional
+            "any", "half", "majority" or a cast fraction, see `ClusterTable.movie_membership`.
+        num_actors_in_movie : dict or pd.Series, optional
+            Cast size of each movie, required unless `select_type` is "any".
 
         Returns
         -------
         DataFrame
             a DataFrame containing metadata of all movies that the group of actors played in.
         """
-        if select_type == "any":
-            movie_ids = self.movies_and_actors["WikipediaId"].unique()
-            return self.movies[self.movies["WikipediaId"].isin(movie_ids)]
-        elif select_type == "half":
-            assert num_actors_in_movie is not None
-
-            good_movie_ids = []
-            cluster_num_actors_in_movie = dict(self.movies_and_actors.groupby("WikipediaId").size())
-            for movie, actor_cnt in cluster_num_actors_in_movie.items():
-                if actor_cnt / num_actors_in_movie[movie] >= 0.5:
-                    good_movie_ids.append(movie)
-            return self.movies[self.movies["WikipediaId"].isin(good_movie_ids)]
-        else:
-            assert False
+        return self.table.cluster_movies(self.label, select_type, num_actors_in_movie)
+
     def cluster_actors(self):
         """
         Gets all the actor names in the cluster.
@@ -288,7 +463,10 @@ class Cluster(ActorStats):
         list
             a list of all the actor names in the cluster.
         """
-        return sorted(list(self.movies_and_actors["ActorName"].unique()))
+        actors = self._cached(
+            "actors", lambda: sorted(list(self.movies_and_actors["ActorName"].unique()))
+        )
+        return list(actors)
 
     def cluster_total_revenue(self):
         """
@@ -301,7 +479,25 @@ class Cluster(ActorStats):
         float64
             The total revenue for the specified cluster.
         """
-        return self.cluster_movies()["Revenue"].sum()
+        return self._cached("total_revenue", lambda: self.cluster_movies()["Revenue"].sum())
+
+    def _compute_genders(self):
+        genders = self.index.attribute(np.unique(self.actor_ids), "ActorGender")
+        female_count = np.count_nonzero(genders == "F")
+        male_count = np.count_nonzero(genders == "M")
+        total = female_count + male_count
+        if total > 0:  # may occur if there are Nans for this data
+            return female_count / total, male_count / total
+        return -1, -1
+
+    def _compute_ages(self):
+        roles = self.table.cluster_roles(self.label)
+        # Keep only positive and non NaN values
+        return (
+            roles[roles["ActorAgeAtRelease"] > 0]["ActorAgeAtRelease"]
+            .dropna()
+            .to_list()
+        )
 
     def cluster_genders(self, plot=False, title="Gender proportions in this actor group"):
         """
@@ -321,26 +517,9 @@ class Cluster(ActorStats):
                 - female_percent (float): The percentage of female actors in the cluster.
                 - male_percent (float): The percentage of male actors in the cluster.
         """
-        # Only keep one movie per actor
-        actors = self.characters[
-            self.characters["FreebaseActorId"].isin(self.actor_ids)
-        ].drop_duplicates(subset="FreebaseActorId")
-        female_count = actors[actors["ActorGender"] == "F"].shape[0]
-        male_count = actors[actors["ActorGender"] == "M"].shape[0]
-        total = female_count + male_count
-        if total > 0:  # may occur if there are Nans for this data
-            female_percent = female_count / total
-            male_percent = male_count / total
-        else:
-            female_percent = -1
-            male_percent = -1
+        female_percent, male_percent = self._cached("genders", self._compute_genders)
         if plot:
-            plt.pie(
-                [female_percent, male_percent],
-                labels=["Female", "Male"],
-                autopct="%1.1f%%",
-            )
-            plt.title(title)
+            draw_cluster_genders(female_percent, male_percent, title)
             plt.show()
         return female_percent, male_percent
 
@@ -361,18 +540,9 @@ class Cluster(ActorStats):
         list of float
             A list containing the ages of the actors at the time of release, for each of their roles.
         """
-        roles = self.characters[self.characters["FreebaseActorId"].isin(self.actor_ids)]
-        # Keep only positive and non NaN values
-        ages = (
-            roles[roles["ActorAgeAtRelease"] > 0]["ActorAgeAtRelease"]
-            .dropna()
-            .to_list()
-        )
+        ages = list(self._cached("ages", self._compute_ages))
         if plot:
-            plt.hist(ages)
-            plt.title(title)
-            plt.xlabel("Age at release")
-            plt.ylabel("Count")
+            draw_cluster_ages(ages, title)
             plt.show()
         return ages
 
@@ -391,25 +561,32 @@ class Cluster(ActorStats):
         dict
             A dictionary where keys are genres and values are the counts of movies within the cluster for each genre.
         """
-        genres = (
-            self.cluster_movies()["Genres"]
-            .apply(lambda genres: Counter(list(ast.literal_eval(genres).values())))
-            .sum()
-        )
-        # Sort by genres by count
-        genres = {p[0]:p[1] for p in sorted(genres.items(), key=lambda pair: pair[1], reverse=True)}
+        genres = dict(self._cached("genres", lambda: self.table.cluster_genres(self.label)))
         if plot:
-            num_values = min(len(genres), 20)  # keep only 20 first genres for readability
-            y = np.arange(num_values)
-            figure = plt.figure(figsize=(10, 5))
-            plt.barh(y, list(genres.values())[:num_values][::-1])
-            plt.yticks(y, list(genres.keys())[:num_values][::-1], fontsize=8)
-            plt.title("Genre distribution in this actor group")
-            plt.xlabel("Movie count")
-            plt.ylabel("Genre")
+            draw_cluster_genres(genres)
             plt.show()
         return genres
 
+    def figure_specs(self, prefix="cluster"):
+        """
+        Declares the gender, age and genre figures of the cluster with their
+        precomputed data, to be rendered to files by `figures.export_figures`.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            Prefix of the figure names, e.g. 'cluster_0'. Defaults to 'cluster'.
+
+        Returns
+        -------
+        list of FigureSpec
+        """
+        return [
+            FigureSpec(f"{prefix}_genders", draw_cluster_genders, self.cluster_genders()),
+            FigureSpec(f"{prefix}_ages", draw_cluster_ages, (self.cluster_ages(),)),
+            FigureSpec(f"{prefix}_genres", draw_cluster_genres, (self.cluster_genres(),)),
+        ]
+
     def compare_genders_with(self, cluster2, titles, colors=["#FF2E63", "#08D9D6"]):
         """
         Compares the gender distributions of two clusters by displaying side-by-side pie charts.
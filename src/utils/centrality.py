@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.data import ROOT_PATH
+from src.utils import csr_graph
+from src.utils.networkx_helpers import sparse_katz_centrality
+
+CACHE_DIR = ROOT_PATH / "data" / "processed" / "centrality"
+METRICS = ("betweenness", "closeness", "katz")
+
+
+def combined_importance(scores):
+    """
+    Combines centralities as in `networkx_helpers.importance`: their mean,
+    normalized by its maximum.
+
+    Parameters
+    ----------
+    scores : DataFrame
+        One column per centrality, one row per node.
+
+    Returns
+    -------
+    pd.Series
+        Importance of each node, between 0 and 1.
+    """
+    mean = scores.mean(axis=1)
+    return mean / mean.max()
+
+
+class CentralityEngine:
+    """
+    Computes centralities of a graph over one shared node index, so metrics
+    are combined as aligned arrays. Each (metric, parameters) result is
+    kept in memory and, given a cache directory, stored on disk keyed by the
+    fingerprint of the graph and reloaded instead of being recomputed.
+    """
+
+    def __init__(self, G, cache_dir=None, n_jobs=None):
+        """
+        Creates a CentralityEngine object.
+
+        Parameters
+        ----------
+        G : networkx.Graph
+            Actors graph, node names are read from the 'Name' attribute if present
+        cache_dir : str, optional
+            Directory of the stored results, e.g. `CACHE_DIR`. Defaults to
+            None: the results are kept in memory only.
+        n_jobs : int, optional
+            Number of worker processes of the BFS based metrics. Defaults to the number of CPUs.
+        """
+        self.G = G
+        self.graph = csr_graph.CSRGraph.from_networkx(G)
+        self.index = pd.Index(self.graph.nodes)
+        self.fingerprint = csr_graph.graph_fingerprint(self.graph)
+        self.cache_dir = cache_dir
+        self.n_jobs = n_jobs
+        self._results = {}
+
+    def _file_name(self, metric, params):
+        key = json.dumps({"metric": metric, "params": params}, sort_keys=True)
+        digest = hashlib.sha1((self.fingerprint + key).encode()).hexdigest()
+        return f"{metric}_{digest[:20]}.pkl"
+
+    def _compute(self, metric, params):
+        if metric == "betweenness":
+            result = csr_graph.betweenness_centrality(self.graph, n_jobs=self.n_jobs, **params)
+            return result.rename(columns={"Betweenness": "Value"})
+        if metric == "closeness":
+            result = csr_graph.closeness_centrality(self.graph, n_jobs=self.n_jobs, **params)
+            return result.rename(columns={"Closeness": "Value"})
+        if metric == "katz":
+            katz = sparse_katz_centrality(self.G, **params)
+            return pd.DataFrame({"Value": pd.Series(katz).reindex(self.index), "Error": 0.0})
+        if metric == "degree":
+            degrees = np.diff(self.graph.indptr) / max(self.graph.n_nodes - 1, 1)
+            return pd.DataFrame({"Value": degrees, "Error": 0.0}, index=self.index)
+        raise ValueError(f"Unknown centrality: {metric}")
+
+    def metric(self, metric, **params):
+        """
+        Gets one centrality, from memory, from disk or by computing it.
+
+        Parameters
+        ----------
+        metric : str
+            'betweenness', 'closeness', 'katz' or 'degree'
+        **params
+            Parameters of the corresponding function: `csr_graph.betweenness_centrality`,
+            `csr_graph.closeness_centrality` or `networkx_helpers.sparse_katz_centrality`.
+
+        Returns
+        -------
+        DataFrame
+            Indexed by node (shared index), with columns "Value" and "Error"
+            (half-width of the confidence interval, 0 for exact values).
+        """
+        file_name = self._file_name(metric, params)
+        if file_name not in self._results:
+            path = None if self.cache_dir is None else os.path.join(self.cache_dir, file_name)
+            if path is not None and os.path.exists(path):
+                result = pd.read_pickle(path)
+            else:
+                result = self._compute(metric, params)
+                if path is not None:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    result.to_pickle(path)
+            # the fingerprint does not depend on the node order, align on this graph's order
+            self._results[file_name] = result.reindex(self.index)
+        return self._results[file_name]
+
+    def table(self, metrics=METRICS, params=None):
+        """
+        Computes several centralities and their combined importance.
+
+        Parameters
+        ----------
+        metrics : tuple of str, optional
+            Centralities to compute. Defaults to `METRICS`.
+        params : dict, optional
+            Parameters of each metric, e.g. {'betweenness': {'k': 500}}.
+
+        Returns
+        -------
+        DataFrame
+            Indexed by node, with a "Name" column (if the nodes have names),
+            one column per metric (capitalized), an "<Metric>Error" column for
+            sampled metrics, and "Importance" (see `combined_importance`),
+            sorted by decreasing importance.
+        """
+        params = params or {}
+        scores = pd.DataFrame(index=self.index)
+        errors = pd.DataFrame(index=self.index)
+        for metric in metrics:
+            result = self.metric(metric, **params.get(metric, {}))
+            scores[metric.capitalize()] = result["Value"].to_numpy()
+            if result["Error"].any():
+                errors[f"{metric.capitalize()}Error"] = result["Error"].to_numpy()
+
+        table = pd.concat([scores, errors], axis=1)
+        table["Importance"] = combined_importance(scores)
+        names = [self.G.nodes[node].get("Name") for node in self.index]
+        if any(name is not None for name in names):
+            table.insert(0, "Name", names)
+        return table.sort_values("Importance", ascending=False, kind="stable")
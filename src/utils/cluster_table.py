@@ -0,0 +1,494 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from src.utils.genres import GenreMatrix
+from src.utils.helpers import merge_movies_and_actors
+from src.utils.indexes import ActorIndex, JoinIndex
+from src.utils.sketches import KLLSketch
+
+LABEL_COLUMN = "ClusterLabel"
+PARTITION_COLUMN = "Partition"
+
+# rows of the labeled table streamed at a time into the revenue sketches
+REVENUE_CHUNK_SIZE = 100_000
+
+
+class ClusterTable:
+    """
+    Stores a whole partition of actors as one label column on a single
+    movies x characters table. Rows are sorted by label, so the rows of a
+    cluster are a contiguous slice and per-cluster statistics are computed
+    with one groupby over the label.
+    """
+
+    def __init__(self, characters, movies, communities):
+        """
+        Creates a ClusterTable object.
+
+        Parameters
+        ----------
+        characters: pd.DataFrame
+            Pre-processed table with characters metadata
+        movies: pd.DataFrame
+            Pre-processed table with movies metadata
+        communities: list of list
+            Partition of the actors, each community is a list of Freebase actor IDs.
+            Repeated IDs within a community are counted once, an actor in
+            several communities raises a ValueError.
+        """
+        self.characters = characters
+        self.movies = movies
+        self.communities = communities
+        self.n_clusters = len(communities)
+
+        self.invalidate()
+
+    def __len__(self):
+        return self.n_clusters
+
+    def _build(self):
+        """Labels the actors and builds the labeled movies x characters table."""
+        communities, characters, movies = self.communities, self.characters, self.movies
+        sizes = [len(community) for community in communities]
+        members = pd.DataFrame({
+            "FreebaseActorId": [actor_id for community in communities for actor_id in community],
+            LABEL_COLUMN: np.repeat(np.arange(self.n_clusters), sizes),
+        }).drop_duplicates()  # an actor listed twice in one community is kept once
+        shared = members["FreebaseActorId"][members["FreebaseActorId"].duplicated()].unique()
+        if len(shared) > 0:
+            raise ValueError(
+                f"Communities must not overlap, {len(shared)} actors are in several communities, e.g. {list(shared[:5])}"
+            )
+        self.actor_labels = pd.Series(
+            members[LABEL_COLUMN].to_numpy(), index=members["FreebaseActorId"].to_numpy()
+        )
+
+        # roles of the clustered actors, as positions in `characters`
+        role_labels = characters["FreebaseActorId"].map(self.actor_labels)
+        role_labels = role_labels.fillna(-1).to_numpy().astype(np.int64)
+        role_positions = np.flatnonzero(role_labels >= 0)
+        order = np.argsort(role_labels[role_positions], kind="stable")
+        self.role_positions = role_positions[order]
+        self.role_offsets = np.searchsorted(
+            role_labels[self.role_positions], np.arange(self.n_clusters + 1)
+        )
+
+        # (movie, role) pairs of the clustered actors, sorted by label
+        join_index = JoinIndex(movies, characters)
+        pair_labels = role_labels[join_index.role_positions]
+        pairs = np.flatnonzero(pair_labels >= 0)
+        pairs = pairs[np.argsort(pair_labels[pairs], kind="stable")]
+        self.join_index = join_index.select(pairs)
+
+        self.frame = merge_movies_and_actors(movies, characters, join_index=self.join_index)
+        self.frame[LABEL_COLUMN] = pair_labels[pairs]
+        self.frame_offsets = np.searchsorted(
+            self.frame[LABEL_COLUMN].to_numpy(), np.arange(self.n_clusters + 1)
+        )
+
+    def invalidate(self):
+        """
+        Rebuilds the labeled table from `characters` and `movies` and drops
+        the cached indexes and matrices derived from them.
+        """
+        self._build()
+        self._actor_index = None
+        self._genre_matrix = None
+        self._movie_role_counts = None
+        self._memberships = {}
+        self._genre_ranking = None
+        self._actor_sketches = {}
+        self._median_sketches = {}
+
+    def cluster_frame(self, label):
+        """
+        Gets the movies x characters rows of one cluster.
+
+        Parameters
+        ----------
+        label : int
+            Index of the cluster in the partition.
+
+        Returns
+        -------
+        DataFrame
+            Merged movies and characters metadata for the actors of the cluster.
+        """
+        rows = self.frame.iloc[self.frame_offsets[label]:self.frame_offsets[label + 1]]
+        return rows.drop(columns=LABEL_COLUMN)
+
+    def cluster_roles(self, label):
+        """
+        Gets all the roles (rows of `characters`) of the actors of one cluster.
+
+        Parameters
+        ----------
+        label : int
+            Index of the cluster in the partition.
+
+        Returns
+        -------
+        DataFrame
+            Characters metadata for the actors of the cluster.
+        """
+        start, stop = self.role_offsets[label], self.role_offsets[label + 1]
+        return self.characters.iloc[self.role_positions[start:stop]]
+
+    @property
+    def actor_index(self):
+        """ActorIndex of `characters` and `movies`, built on first access."""
+        if self._actor_index is None:
+            self._actor_index = ActorIndex(self.characters, self.movies)
+        return self._actor_index
+
+    @property
+    def genre_matrix(self):
+        """GenreMatrix of `movies`, built on first access."""
+        if self._genre_matrix is None:
+            self._genre_matrix = GenreMatrix(self.movies)
+        return self._genre_matrix
+
+    def movie_role_counts(self):
+        """
+        Gets the number of roles of each cluster in each movie.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Clusters x movies count matrix, columns follow the rows of `movies`.
+        """
+        if self._movie_role_counts is None:
+            counts = sp.csr_matrix(
+                (
+                    np.ones(len(self.join_index), dtype=np.int64),
+                    (self.frame[LABEL_COLUMN].to_numpy(), self.join_index.movie_positions),
+                ),
+                shape=(self.n_clusters, len(self.movies)),
+            )
+            counts.sum_duplicates()
+            self._movie_role_counts = counts
+        return self._movie_role_counts
+
+    def movie_membership(self, select_type="any", num_actors_in_movie=None):
+        """
+        Assigns movies to all the clusters at once. The last matrix of each
+        `select_type` is cached with the `num_actors_in_movie` object it was
+        computed from, so per-cluster lookups share it; call `invalidate` after
+        modifying `num_actors_in_movie` in place.
+
+        Parameters
+        ----------
+        select_type : str or float, optional
+            - "any": movies where at least one actor of the cluster played in (default).
+            - "half": movies where the cluster has at least half of the cast.
+            - "majority": movies where the cluster has strictly more than half of the cast.
+            - float f: movies where the cluster has at least a fraction f of the cast.
+        num_actors_in_movie : dict or pd.Series, optional
+            Cast size of each movie, keyed by Wikipedia ID. Required unless
+            `select_type` is "any".
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Binary clusters x movies matrix, columns follow the rows of `movies`.
+        """
+        cached = self._memberships.get(select_type)
+        # cast sizes given as another object replace the cached matrix
+        if cached is None or (select_type != "any" and cached[0] is not num_actors_in_movie):
+            cached = (num_actors_in_movie, self._compute_membership(select_type, num_actors_in_movie))
+            self._memberships[select_type] = cached
+        return cached[1]
+
+    def _compute_membership(self, select_type, num_actors_in_movie):
+        counts = self.movie_role_counts()
+        if select_type == "any":
+            membership = counts.copy()
+            membership.data[:] = 1
+            return membership
+
+        assert num_actors_in_movie is not None
+        cast_sizes = pd.Series(num_actors_in_movie).reindex(self.movies["WikipediaId"]).to_numpy()
+        fractions = counts.data / cast_sizes[counts.indices]
+        if select_type == "half":
+            keep = fractions >= 0.5
+        elif select_type == "majority":
+            keep = fractions > 0.5
+        elif isinstance(select_type, float):
+            keep = fractions >= select_type
+        else:
+            assert False
+        membership = counts.copy()
+        membership.data = keep.astype(np.int64)
+        membership.eliminate_zeros()
+        return membership
+
+    def cluster_movie_rows(self, membership, label):
+        """
+        Gets the movies of one cluster from a membership matrix.
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted row positions in `movies`.
+        """
+        return membership.indices[membership.indptr[label]:membership.indptr[label + 1]]
+
+    def cluster_movies(self, label, select_type="any", num_actors_in_movie=None):
+        """
+        Gets the movies assigned to one cluster, see `movie_membership`.
+
+        Returns
+        -------
+        DataFrame
+            Metadata of the movies of the cluster, in the order of `movies`.
+        """
+        membership = self.movie_membership(select_type, num_actors_in_movie)
+        return self.movies.iloc[self.cluster_movie_rows(membership, label)]
+
+    def genre_ranking(self):
+        """
+        Ranks the genres of the movies of every cluster, see `GenreMatrix.ranked_genres`.
+
+        Returns
+        -------
+        tuple
+            Clusters x genres histogram, ranked genre ids, their counts and
+            the offsets of each cluster.
+        """
+        if self._genre_ranking is None:
+            self._genre_ranking = self.genre_matrix.ranked_genres(self.movie_membership())
+        return self._genre_ranking
+
+    def cluster_genres(self, label):
+        """
+        Gets the genre distribution of the movies of one cluster.
+
+        Parameters
+        ----------
+        label : int
+            Index of the cluster in the partition.
+
+        Returns
+        -------
+        dict
+            Genre names mapped to movie counts, sorted by decreasing count.
+        """
+        _, genres, counts, offsets = self.genre_ranking()
+        start, stop = offsets[label], offsets[label + 1]
+        return dict(zip(self.genre_matrix.genres[genres[start:stop]], counts[start:stop].tolist()))
+
+    def nth_genres(self, n):
+        """
+        Gets the n-th most common genre of every cluster that has at least n genres.
+
+        Parameters
+        ----------
+        n : int
+            Rank of the genre, starting from 1.
+
+        Returns
+        -------
+        list of str
+            Genre names, in cluster order.
+        """
+        _, genres, _, offsets = self.genre_ranking()
+        has_nth = np.diff(offsets) >= n
+        return self.genre_matrix.genres[genres[offsets[:-1][has_nth] + n - 1]].tolist()
+
+    def actor_revenue_sketches(self, k=200, chunk_size=REVENUE_CHUNK_SIZE):
+        """
+        Streams the movie revenues of the labeled table, `chunk_size` rows at a
+        time, into one KLLSketch per actor. An actor whose roles span several
+        chunks keeps updating the same sketch, so memory stays O(k log(n / k))
+        per actor whatever the number of roles.
+
+        Parameters
+        ----------
+        k : int, optional
+            Size parameter of the sketches, see `KLLSketch`. Defaults to 200.
+        chunk_size : int, optional
+            Number of rows of the labeled table read at a time. Defaults to `REVENUE_CHUNK_SIZE`.
+
+        Returns
+        -------
+        list of dict
+            For each cluster, the Freebase IDs of its actors with a known
+            revenue mapped to the sketch of their movie revenues.
+        """
+        key = (k, chunk_size)
+        if key not in self._actor_sketches:
+            sketches = [{} for _ in range(self.n_clusters)]
+            columns = self.frame[[LABEL_COLUMN, "FreebaseActorId", "Revenue"]]
+            for start in range(0, len(columns), chunk_size):
+                chunk = columns.iloc[start:start + chunk_size].dropna(subset=["Revenue"])
+                for (label, actor_id), revenues in chunk.groupby([LABEL_COLUMN, "FreebaseActorId"]).Revenue:
+                    if actor_id not in sketches[label]:
+                        sketches[label][actor_id] = KLLSketch(k, seed=label)
+                    sketches[label][actor_id].update_many(revenues.to_numpy())
+            self._actor_sketches[key] = sketches
+        return self._actor_sketches[key]
+
+    def median_revenue_sketches(self, k=200):
+        """
+        Builds mergeable quantile sketches for the median revenue of each
+        cluster: the median of every actor sketch of `actor_revenue_sketches`
+        is summarized by one KLLSketch per cluster. Merging the sketches of two
+        clusters gives the sketch of their union.
+
+        Parameters
+        ----------
+        k : int, optional
+            Size parameter of the sketches, see `KLLSketch`. Defaults to 200.
+
+        Returns
+        -------
+        list of KLLSketch
+            One sketch per cluster; `median()` approximates `Cluster.cluster_median_revenue`,
+            see `median_revenue_rank_errors` for the error bound.
+        """
+        if k not in self._median_sketches:
+            sketches = []
+            for label, actor_sketches in enumerate(self.actor_revenue_sketches(k)):
+                sketch = KLLSketch(k, seed=label)
+                sketch.update_many(actor_sketch.median() for actor_sketch in actor_sketches.values())
+                sketches.append(sketch)
+            self._median_sketches[k] = sketches
+        return self._median_sketches[k]
+
+    def median_revenue_rank_errors(self, k=200):
+        """
+        Gets the error bounds of the sketched median revenues, which combine two
+        levels of sketches. The median of a cluster has a rank within
+        `ClusterRankError * n` of the median of its n sketched actor medians,
+        and each of these has a rank within `ActorRankError * m` of the exact
+        median of the m revenues of its actor. Both are 0 when every sketch
+        is exact, the median is then the same as `Cluster.cluster_median_revenue`.
+
+        Parameters
+        ----------
+        k : int, optional
+            Size parameter of the sketches, see `KLLSketch`. Defaults to 200.
+
+        Returns
+        -------
+        DataFrame
+            Normalized rank errors of each cluster: "ClusterRankError" of the
+            cluster sketch and "ActorRankError", the largest one of its actor sketches.
+        """
+        actor_errors = [
+            max((sketch.rank_error() for sketch in actor_sketches.values()), default=0.0)
+            for actor_sketches in self.actor_revenue_sketches(k)
+        ]
+        return pd.DataFrame({
+            "ClusterRankError": [sketch.rank_error() for sketch in self.median_revenue_sketches(k)],
+            "ActorRankError": actor_errors,
+        })
+
+    def sizes(self):
+        """
+        Gets the number of actors in each cluster.
+
+        Returns
+        -------
+        numpy.ndarray
+            Number of actors of each cluster.
+        """
+        return np.array([len(community) for community in self.communities])
+
+    def statistics(self):
+        """
+        Computes all the per-cluster aggregates used by `Graph` in one pass:
+        one groupby over the labeled movies x characters table for revenues,
+        array reductions over the labeled roles for ages and over the actor
+        table of the ActorIndex for genders.
+
+        Returns
+        -------
+        DataFrame
+            Indexed by cluster label, with columns:
+            - "Size": number of actors.
+            - "MeanRevenue": mean over the actors of their mean movie revenue.
+            - "MedianRevenue": median over the actors of their median movie revenue.
+            - "Ages": list of positive ages at release of all the roles.
+            - "AgeCount": length of "Ages".
+            - "MeanAge": mean of "Ages" (NaN if empty).
+            - "Female", "Male": proportion of female and male actors, each actor
+              counted once with the gender of their first role (-1 if unknown).
+        """
+        clusters = pd.RangeIndex(self.n_clusters, name=LABEL_COLUMN)
+        stats = pd.DataFrame({"Size": self.sizes()}, index=clusters)
+
+        actor_revenues = self.frame.groupby([LABEL_COLUMN, "FreebaseActorId"]).Revenue.agg(
+            ["mean", "median"]
+        )
+        cluster_revenues = actor_revenues.groupby(level=0).agg(
+            {"mean": "mean", "median": "median"}
+        )
+        stats["MeanRevenue"] = cluster_revenues["mean"].reindex(clusters)
+        stats["MedianRevenue"] = cluster_revenues["median"].reindex(clusters)
+
+        role_labels = np.repeat(np.arange(self.n_clusters), np.diff(self.role_offsets))
+        roles = self.characters.iloc[self.role_positions]
+
+        ages = roles["ActorAgeAtRelease"].to_numpy()
+        keep = ages > 0  # also drops NaNs
+        age_labels = role_labels[keep]
+        ages = ages[keep]
+        offsets = np.searchsorted(age_labels, np.arange(self.n_clusters + 1))
+        age_list = ages.tolist()
+        stats["Ages"] = pd.Series(
+            [age_list[offsets[i]:offsets[i + 1]] for i in range(self.n_clusters)],
+            index=clusters,
+            dtype=object,
+        )
+        stats["AgeCount"] = np.diff(offsets)
+        age_sums = np.bincount(age_labels, weights=ages, minlength=self.n_clusters)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats["MeanAge"] = age_sums / stats["AgeCount"].to_numpy()
+
+        codes = self.actor_index.codes(self.actor_labels.index)
+        genders = self.actor_index.actors["ActorGender"].to_numpy()[codes[codes >= 0]]
+        gender_labels = self.actor_labels.to_numpy()[codes >= 0]
+        female = np.bincount(gender_labels[genders == "F"], minlength=self.n_clusters)
+        male = np.bincount(gender_labels[genders == "M"], minlength=self.n_clusters)
+        total = female + male
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats["Female"] = np.where(total > 0, female / total, -1)
+            stats["Male"] = np.where(total > 0, male / total, -1)
+        return stats
+
+
+def stack_partitions(partitions):
+    """
+    Stacks the memberships of several partitions into one label table, so
+    per-cluster statistics of all of them are computed with one join and one
+    groupby over (partition, label).
+
+    Parameters
+    ----------
+    partitions : dict or list
+        Partitions (each a list of communities of Freebase actor IDs), keyed
+        by a scalar such as a seed or a resolution. A list is keyed by position.
+
+    Returns
+    -------
+    tuple
+        - DataFrame with columns "Partition", "ClusterLabel" and
+          "FreebaseActorId", one row per distinct (partition, cluster, actor).
+        - MultiIndex of all the (partition, label) pairs, empty clusters included.
+    """
+    items = list(partitions.items() if isinstance(partitions, dict) else enumerate(partitions))
+    keys = [key for key, communities in items for _ in communities]
+    labels = [label for _, communities in items for label in range(len(communities))]
+    sizes = [len(community) for _, communities in items for community in communities]
+    clusters = pd.MultiIndex.from_arrays([keys, labels], names=[PARTITION_COLUMN, LABEL_COLUMN])
+
+    codes = np.repeat(np.arange(len(clusters)), sizes)
+    members = pd.DataFrame({
+        PARTITION_COLUMN: clusters.get_level_values(0)[codes],
+        LABEL_COLUMN: clusters.get_level_values(1)[codes],
+        "FreebaseActorId": [actor_id for _, communities in items for community in communities for actor_id in community],
+    })
+    # a community listing an actor twice still counts them once, as with `isin`
+    return members.drop_duplicates(ignore_index=True), clusters
@@ -0,0 +1,702 @@
+import hashlib
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.sparse.csgraph import connected_components
+
+from src.utils.genres import _ragged_positions
+from src.utils.lazy import LazyModule
+
+stats = LazyModule("scipy.stats")
+
+# below this size, starting a process pool costs more than the traversals
+SERIAL_MAX_NODES = 2000
+
+_worker_graph = None
+
+
+def largest_eigenvalue(A):
+    """
+    Computes the largest eigenvalue of a symmetric sparse matrix with the
+    Lanczos method, without densifying it.
+
+    Parameters
+    ----------
+    A : scipy.sparse matrix
+        Symmetric matrix, e.g. the adjacency matrix of an undirected graph.
+
+    Returns
+    -------
+    float
+        The largest eigenvalue (the spectral radius for an adjacency matrix).
+    """
+    if A.shape[0] < 3 or A.nnz == 0:  # eigsh needs at least 3 rows
+        return float(np.max(np.linalg.eigvalsh(A.toarray()), initial=0.0))
+    return float(spla.eigsh(A.astype(np.float64), k=1, which="LA", return_eigenvectors=False)[0])
+
+
+class CSRGraph:
+    """
+    Undirected graph stored as CSR arrays (`indptr`, `indices`) over integer
+    node codes. Traversals expand a whole BFS frontier at once with array
+    operations instead of visiting nodes one by one.
+    """
+
+    def __init__(self, nodes, indptr, indices):
+        """
+        Creates a CSRGraph object.
+
+        Parameters
+        ----------
+        nodes : list
+            Node identifiers, the code of a node is its position in this list
+        indptr : numpy.ndarray
+            Offsets of the neighbors of each node in `indices`
+        indices : numpy.ndarray
+            Neighbor codes, node after node
+        """
+        self.nodes = list(nodes)
+        self.node_index = pd.Index(self.nodes)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+
+    @staticmethod
+    def from_networkx(G):
+        """Builds a CSRGraph from a networkx graph, codes follow the order of `G.nodes`."""
+        nodes = list(G.nodes)
+        A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=None, format="csr")
+        return CSRGraph(nodes, A.indptr, A.indices)
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    def codes(self, nodes):
+        """Gets the code of each node, -1 for unknown nodes."""
+        return self.node_index.get_indexer(nodes)
+
+    def components(self):
+        """
+        Gets the connected components.
+
+        Returns
+        -------
+        tuple
+            - numpy.ndarray, component label of each node.
+            - numpy.ndarray, size of each component.
+        """
+        _, labels = connected_components(self.adjacency(), directed=False)
+        return labels, np.bincount(labels)
+
+    def adjacency(self):
+        """Gets the adjacency matrix as a scipy.sparse.csr_matrix of floats."""
+        n = self.n_nodes
+        return sp.csr_matrix((np.ones(len(self.indices)), self.indices, self.indptr), shape=(n, n))
+
+    def expand(self, frontier):
+        """
+        Gets all the edges leaving a set of nodes.
+
+        Parameters
+        ----------
+        frontier : numpy.ndarray
+            Node codes
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            Source and target codes of the edges.
+        """
+        positions, lengths = _ragged_positions(self.indptr, frontier)
+        return np.repeat(frontier, lengths), self.indices[positions]
+
+
+def graph_fingerprint(graph):
+    """
+    Hashes the nodes and edges of a graph, independently of the node order.
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-1 digest.
+    """
+    names = np.array([str(node) for node in graph.nodes], dtype=object)
+    order = np.argsort(names, kind="stable")
+    ranks = np.empty(len(names), dtype=np.int64)
+    ranks[order] = np.arange(len(names))
+    sources = ranks[np.repeat(np.arange(len(names)), np.diff(graph.indptr))]
+    targets = ranks[graph.indices]
+    keep = sources < targets
+    edges = np.stack([sources[keep], targets[keep]], axis=1)
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+
+    digest = hashlib.sha1()
+    digest.update("\n".join(names[order]).encode())
+    digest.update(edges.tobytes())
+    return digest.hexdigest()
+
+
+def bfs_distances(graph, source):
+    """
+    Computes the shortest path length (number of edges) from one node to all the others.
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+    source : int
+        Code of the source node
+
+    Returns
+    -------
+    numpy.ndarray
+        Distance to every node, -1 for nodes in other components.
+    """
+    distances = np.full(graph.n_nodes, -1, dtype=np.int64)
+    distances[source] = 0
+    frontier = np.array([source], dtype=np.int64)
+    depth = 0
+    while len(frontier) > 0:
+        _, w = graph.expand(frontier)
+        frontier = np.unique(w[distances[w] < 0])
+        distances[frontier] = depth + 1
+        depth += 1
+    return distances
+
+
+def brandes_dependencies(graph, source):
+    """
+    Runs one step of Brandes' algorithm: a BFS from `source` counting the
+    shortest paths, then the backward accumulation of the dependencies.
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+    source : int
+        Code of the source node
+
+    Returns
+    -------
+    numpy.ndarray
+        Dependency of `source` on every node, summing them over all sources
+        gives twice the unnormalized betweenness of an undirected graph.
+    """
+    n = graph.n_nodes
+    distances = np.full(n, -1, dtype=np.int64)
+    distances[source] = 0
+    sigma = np.zeros(n)
+    sigma[source] = 1
+    frontier = np.array([source], dtype=np.int64)
+    levels = []  # edges (v, w) of the shortest paths DAG, level by level
+    depth = 0
+    while len(frontier) > 0:
+        v, w = graph.expand(frontier)
+        frontier = np.unique(w[distances[w] < 0])
+        distances[frontier] = depth + 1
+        on_path = distances[w] == depth + 1
+        v, w = v[on_path], w[on_path]
+        sigma += np.bincount(w, weights=sigma[v], minlength=n)
+        levels.append((v, w))
+        depth += 1
+
+    delta = np.zeros(n)
+    for v, w in reversed(levels):
+        delta += np.bincount(v, weights=sigma[v] / sigma[w] * (1 + delta[w]), minlength=n)
+    delta[source] = 0
+    return delta
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _accumulate_dependencies(sources):
+    sums = np.zeros(_worker_graph.n_nodes)
+    squares = np.zeros(_worker_graph.n_nodes)
+    for source in sources:
+        delta = brandes_dependencies(_worker_graph, source)
+        sums += delta
+        squares += delta ** 2
+    return sums, squares
+
+
+def _distance_sums(sources):
+    return [bfs_distances(_worker_graph, source).clip(0).sum() for source in sources]
+
+
+def _pivot_distances(pivots):
+    sums = np.zeros(_worker_graph.n_nodes)
+    squares = np.zeros(_worker_graph.n_nodes)
+    for pivot in pivots:
+        distances = bfs_distances(_worker_graph, pivot).clip(0)  # other components add 0
+        sums += distances
+        squares += distances ** 2
+    return sums, squares
+
+
+def _pair_distances(queries):
+    return [bfs_distances(_worker_graph, source)[targets] for source, targets in queries]
+
+
+def _distance_histogram(sources):
+    histogram = np.zeros(1, dtype=np.int64)
+    for source in sources:
+        distances = bfs_distances(_worker_graph, source)
+        counts = np.bincount(distances[distances > 0])
+        histogram = np.pad(histogram, (0, max(len(counts) - len(histogram), 0)))
+        histogram[:len(counts)] += counts
+    return histogram
+
+
+def _chunks(sources, chunk_size):
+    return [sources[i:i + chunk_size] for i in range(0, len(sources), chunk_size)]
+
+
+def _n_jobs(graph, n_jobs):
+    """Number of worker processes, 1 by default for graphs too small to pay for a process pool."""
+    if n_jobs is None and graph.n_nodes < SERIAL_MAX_NODES:
+        return 1
+    return n_jobs
+
+
+@contextmanager
+def _worker_map(graph, n_jobs):
+    """
+    Yields a `map` over a process pool sharing `graph`, or the builtin `map`
+    if n_jobs is 1 (or None for a graph of less than `SERIAL_MAX_NODES` nodes).
+    """
+    if _n_jobs(graph, n_jobs) == 1:
+        _init_worker(graph)
+        yield map
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(graph,)) as executor:
+            yield executor.map
+
+
+def _ranking(values, top_k):
+    return tuple(np.argsort(-values, kind="stable")[:top_k].tolist())
+
+
+def betweenness_centrality(
+    graph,
+    k=None,
+    seed=1,
+    n_jobs=None,
+    chunk_size=16,
+    confidence=0.95,
+    adaptive=False,
+    top_k=5,
+    patience=2,
+):
+    """
+    Computes the normalized betweenness centrality (same scale as
+    `nx.betweenness_centrality(G, normalized=True)`), either exactly or from a
+    sample of source pivots. Brandes' accumulation runs over chunks of sources
+    in a process pool.
+
+    The estimate from k pivots drawn without replacement is n / k times the
+    sum of their dependencies; its confidence interval uses the sample
+    variance of the per-pivot contributions (with finite population
+    correction, so it is 0 when every node is a pivot). This normal
+    approximation is optimistic for nodes that lie on few sampled paths.
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+    k : int, optional
+        Number of pivots. If None, all the nodes are used (exact values), or,
+        in adaptive mode, the maximum number of pivots.
+    seed : int, optional
+        Seed of the pivot sampling. Defaults to 1.
+    n_jobs : int, optional
+        Number of worker processes. If 1, everything runs in the current
+        process. Defaults to the number of CPUs, or to 1 for graphs of less
+        than `SERIAL_MAX_NODES` nodes.
+    chunk_size : int, optional
+        Number of sources sent to a worker at once. Defaults to 16.
+    confidence : float, optional
+        Level of the confidence intervals. Defaults to 0.95.
+    adaptive : bool, optional
+        If True, pivots are added by rounds of `chunk_size` pivots per worker
+        until the ranking of the `top_k` nodes has not changed for `patience`
+        rounds.
+    top_k : int, optional
+        Size of the ranking checked in adaptive mode. Defaults to 5.
+    patience : int, optional
+        Number of rounds without change of the ranking before stopping. Defaults to 2.
+
+    Returns
+    -------
+    DataFrame
+        Indexed by node, with columns "Betweenness" and "Error" (half-width of
+        the confidence interval). `attrs["samples"]` holds the number of pivots.
+    """
+    n = graph.n_nodes
+    order = np.random.default_rng(seed).permutation(n)
+    max_samples = n if k is None else min(k, n)
+    sums = np.zeros(n)
+    squares = np.zeros(n)
+
+    n_jobs = _n_jobs(graph, n_jobs)
+    n_workers = 1 if n_jobs == 1 else (n_jobs or os.cpu_count())
+    round_size = max_samples if not adaptive else chunk_size * n_workers
+    samples = 0
+    ranking, stable_rounds = None, 0
+    with _worker_map(graph, n_jobs) as worker_map:
+        while samples < max_samples:
+            sources = order[samples:min(samples + round_size, max_samples)]
+            for chunk_sums, chunk_squares in worker_map(_accumulate_dependencies, _chunks(sources, chunk_size)):
+                sums += chunk_sums
+                squares += chunk_squares
+            samples += len(sources)
+            if adaptive:
+                new_ranking = _ranking(sums, top_k)
+                stable_rounds = stable_rounds + 1 if new_ranking == ranking else 0
+                ranking = new_ranking
+                if stable_rounds >= patience:
+                    break
+
+    # dependencies of an undirected graph count every pair twice, as in networkx
+    scale = 1 / ((n - 1) * (n - 2)) if n > 2 else 1.0
+    contributions_mean = sums / samples
+    estimate = n * scale * contributions_mean
+    error = np.zeros(n)
+    if 1 < samples < n:
+        variance = (squares - samples * contributions_mean ** 2) / (samples - 1)
+        correction = (n - samples) / (n - 1)
+        standard_error = n * scale * np.sqrt(np.maximum(variance, 0) * correction / samples)
+        error = stats.norm.ppf((1 + confidence) / 2) * standard_error
+
+    result = pd.DataFrame({"Betweenness": estimate, "Error": error}, index=graph.nodes)
+    result.attrs["samples"] = samples
+    return result
+
+
+def closeness_centrality(graph, k=None, seed=1, n_jobs=None, chunk_size=64, confidence=0.95):
+    """
+    Computes the closeness centrality (same definition as
+    `nx.closeness_centrality`, with the Wasserman and Faust correction for
+    disconnected graphs), with one BFS per source in a process pool.
+
+    With `k` pivots, the pivots are spread over the components proportionally
+    to their size (at least 3 each), and the sum of the distances from a node
+    to the rest of its component is estimated from its distances to the
+    pivots of the component (Eppstein-Wang). Components that get as many
+    pivots as nodes are exact.
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+    k : int, optional
+        Number of pivots. If None, exact closeness (one BFS per node).
+    seed : int, optional
+        Seed of the pivot sampling. Defaults to 1.
+    n_jobs : int, optional
+        Number of worker processes. If 1, everything runs in the current
+        process. Defaults to the number of CPUs, or to 1 for graphs of less
+        than `SERIAL_MAX_NODES` nodes.
+    chunk_size : int, optional
+        Number of sources sent to a worker at once. Defaults to 64.
+    confidence : float, optional
+        Level of the confidence intervals. Defaults to 0.95.
+
+    Returns
+    -------
+    DataFrame
+        Indexed by node, with columns "Closeness" and "Error" (half-width of
+        the confidence interval). `attrs["samples"]` holds the number of BFS.
+    """
+    n = graph.n_nodes
+    labels, sizes = graph.components()
+    reach = sizes[labels]  # size of the component of each node
+    error = np.zeros(n)
+
+    with _worker_map(graph, n_jobs) as worker_map:
+        if k is None:
+            sources = np.arange(n)
+            totals = np.array([
+                total for chunk in worker_map(_distance_sums, _chunks(sources, chunk_size)) for total in chunk
+            ], dtype=np.float64)
+            samples = n
+        else:
+            rng = np.random.default_rng(seed)
+            # at least 3 pivots per component, so that every node has 2 pivots other than itself
+            pivot_counts = np.minimum(sizes, np.maximum(np.ceil(k * sizes / n), 3).astype(np.int64))
+            pivots = np.concatenate([
+                rng.choice(np.flatnonzero(labels == component), pivot_counts[component], replace=False)
+                for component in range(len(sizes))
+            ])
+            sums = np.zeros(n)
+            squares = np.zeros(n)
+            for chunk_sums, chunk_squares in worker_map(_pivot_distances, _chunks(pivots, chunk_size)):
+                sums += chunk_sums
+                squares += chunk_squares
+            samples = len(pivots)
+
+            # the distances to the other nodes are sampled by the pivots other than the node itself
+            is_pivot = np.zeros(n, dtype=bool)
+            is_pivot[pivots] = True
+            counts = pivot_counts[labels] - is_pivot
+            others = reach - 1
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.where(counts > 0, sums / counts, 0)
+                variance = (squares - counts * mean ** 2) / np.maximum(counts - 1, 1)
+                correction = (others - counts) / np.maximum(others - 1, 1)
+                total_errors = others * np.sqrt(np.maximum(variance, 0) * correction / counts)
+            totals = others * mean
+            sampled = counts < others
+            with np.errstate(invalid="ignore", divide="ignore"):
+                # delta method: closeness is proportional to 1 / total
+                error = np.where(sampled & (totals > 0), total_errors / totals, 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        closeness = np.where(totals > 0, (reach - 1) / totals * (reach - 1) / max(n - 1, 1), 0.0)
+    error = stats.norm.ppf((1 + confidence) / 2) * error * closeness
+
+    result = pd.DataFrame({"Closeness": closeness, "Error": error}, index=graph.nodes)
+    result.attrs["samples"] = samples
+    return result
+
+
+def shortest_path_lengths(graph, pairs, n_jobs=None, chunk_size=64):
+    """
+    Answers a batch of shortest path length queries ("degrees of separation"
+    between actors). Queries are grouped by source so that each source needs
+    a single BFS; each pair is oriented from its most queried endpoint.
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+    pairs : list of tuple
+        Pairs of nodes (identifiers, not codes)
+    n_jobs : int, optional
+        Number of worker processes. If 1, everything runs in the current
+        process. Defaults to the number of CPUs, or to 1 for graphs of less
+        than `SERIAL_MAX_NODES` nodes.
+    chunk_size : int, optional
+        Number of sources sent to a worker at once. Defaults to 64.
+
+    Returns
+    -------
+    numpy.ndarray
+        Length of each pair, -1 if the nodes are not connected.
+    """
+    pairs = list(pairs)
+    if len(pairs) == 0:
+        return np.array([], dtype=np.int64)
+    codes = graph.codes([node for pair in pairs for node in pair]).reshape(-1, 2)
+    assert (codes >= 0).all(), "unknown nodes in the queries"
+
+    queried = np.bincount(codes.ravel(), minlength=graph.n_nodes)
+    swap = queried[codes[:, 1]] > queried[codes[:, 0]]
+    sources = np.where(swap, codes[:, 1], codes[:, 0])
+    targets = np.where(swap, codes[:, 0], codes[:, 1])
+
+    order = np.argsort(sources, kind="stable")
+    unique_sources, starts = np.unique(sources[order], return_index=True)
+    groups = np.split(order, starts[1:])
+    queries = [(source, targets[group]) for source, group in zip(unique_sources, groups)]
+
+    lengths = np.empty(len(pairs), dtype=np.int64)
+    with _worker_map(graph, n_jobs) as worker_map:
+        results = [distances for chunk in worker_map(_pair_distances, _chunks(queries, chunk_size)) for distances in chunk]
+    for group, distances in zip(groups, results):
+        lengths[group] = distances
+    return lengths
+
+
+def degrees_of_separation(graph, k=None, seed=1, n_jobs=None, chunk_size=64):
+    """
+    Computes the distribution of the shortest path lengths between connected
+    pairs of nodes, from all the nodes or from k random sources.
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+    k : int, optional
+        Number of sources. If None, all the nodes are used.
+    seed : int, optional
+        Seed of the source sampling. Defaults to 1.
+    n_jobs : int, optional
+        Number of worker processes. If 1, everything runs in the current
+        process. Defaults to the number of CPUs, or to 1 for graphs of less
+        than `SERIAL_MAX_NODES` nodes.
+    chunk_size : int, optional
+        Number of sources sent to a worker at once. Defaults to 64.
+
+    Returns
+    -------
+    pd.Series
+        Number of (source, target) pairs at each distance, indexed by distance.
+    """
+    n = graph.n_nodes
+    sources = np.arange(n) if k is None else np.random.default_rng(seed).choice(n, min(k, n), replace=False)
+    histogram = np.zeros(1, dtype=np.int64)
+    with _worker_map(graph, n_jobs) as worker_map:
+        for counts in worker_map(_distance_histogram, _chunks(sources, chunk_size)):
+            histogram = np.pad(histogram, (0, max(len(counts) - len(histogram), 0)))
+            histogram[:len(counts)] += counts
+    return pd.Series(histogram[1:], index=pd.RangeIndex(1, len(histogram), name="Distance"), name="Pairs")
+
+
+def _bounded_closeness(graph, source, reach, threshold):
+    """Closeness of `source`, or None as soon as an upper bound falls below `threshold`."""
+    n = graph.n_nodes
+    if reach <= 1:
+        return 0.0
+    distances = np.full(n, -1, dtype=np.int64)
+    distances[source] = 0
+    frontier = np.array([source], dtype=np.int64)
+    total, visited, depth = 0, 1, 0
+    while len(frontier) > 0:
+        # the nodes not reached yet are at distance depth + 1 or more
+        lower_total = total + (reach - visited) * (depth + 1)
+        if (reach - 1) / lower_total * (reach - 1) / max(n - 1, 1) < threshold:
+            return None
+        _, w = graph.expand(frontier)
+        frontier = np.unique(w[distances[w] < 0])
+        distances[frontier] = depth + 1
+        total += (depth + 1) * len(frontier)
+        visited += len(frontier)
+        depth += 1
+    return (reach - 1) / total * (reach - 1) / max(n - 1, 1)
+
+
+def top_k_closeness(graph, k=10):
+    """
+    Finds the k nodes with the highest closeness (same values and ties order
+    as `closeness_centrality`) without a full BFS from every node. Nodes are
+    visited by decreasing degree; the BFS of a node stops as soon as a lower
+    bound on its sum of distances shows that it cannot enter the current top k.
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+    k : int, optional
+        Number of nodes. Defaults to 10.
+
+    Returns
+    -------
+    DataFrame
+        Indexed by node, with a "Closeness" column, sorted by decreasing
+        closeness (ties by node order). `attrs["pruned"]` holds the number of
+        BFS stopped early.
+    """
+    labels, sizes = graph.components()
+    reach = sizes[labels]
+    degrees = np.diff(graph.indptr)
+    best = []  # min-heap of (closeness, -code), the worst of the top k first
+    pruned = 0
+    for source in np.lexsort((np.arange(graph.n_nodes), -degrees)).tolist():
+        threshold = best[0][0] if len(best) == k else -np.inf
+        closeness = _bounded_closeness(graph, source, reach[source], threshold)
+        if closeness is None:
+            pruned += 1
+        elif len(best) < k:
+            heapq.heappush(best, (closeness, -source))
+        else:
+            heapq.heappushpop(best, (closeness, -source))
+
+    best = sorted(best, reverse=True)
+    result = pd.DataFrame(
+        {"Closeness": [closeness for closeness, _ in best]},
+        index=[graph.nodes[-code] for _, code in best],
+    )
+    result.attrs["pruned"] = pruned
+    return result
+
+
+def _ranking_certified(values, order, k, error):
+    """True if the first k+1 values of `order` are separated by more than twice the error."""
+    ranked = values[order[:k + 1]]
+    return bool(np.all(ranked[:-1] - ranked[1:] > 2 * error))
+
+
+def top_k_katz(graph, k=10, alpha_fraction=0.9, beta=1.0, tol=1e-12, max_iterations=100000):
+    """
+    Finds the k nodes with the highest Katz centrality (same definition as
+    `networkx_helpers.sparse_katz_centrality`) by iterating
+    x <- beta + alpha A x and stopping as soon as the ranking of the top k is
+    certified. Since I - alpha A has eigenvalues at least 1 - alpha λ_max,
+    the distance to the exact solution is bounded by the residual, and the
+    ranking is certified when consecutive values are further apart than
+    twice this bound. The values of the k nodes are then refined with a
+    conjugate gradient solve, so they match `sparse_katz_centrality` up to `tol`.
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+    k : int, optional
+        Number of nodes. Defaults to 10.
+    alpha_fraction : float, optional
+        alpha = alpha_fraction / λ_max. Defaults to 0.9.
+    beta : float, optional
+        Constant attenuation term. Defaults to 1.
+    tol : float, optional
+        Relative error at which iterations stop even if the ranking is not
+        certified (ties), and relative tolerance of the final solve. Defaults to 1e-12.
+    max_iterations : int, optional
+        Maximum number of iterations. Defaults to 100000.
+
+    Returns
+    -------
+    DataFrame
+        Indexed by node, with columns "Katz" (normalized to unit Euclidean
+        norm as in networkx) and "Error" (bound on the normalized error),
+        sorted by decreasing centrality. `attrs["iterations"]` holds the
+        number of iterations.
+    """
+    A = graph.adjacency()
+    largest = largest_eigenvalue(A)
+    alpha = alpha_fraction / largest if largest > 0 else alpha_fraction
+    contraction = alpha * largest
+    codes = np.arange(graph.n_nodes)
+    k = min(k, graph.n_nodes)
+
+    x = np.full(graph.n_nodes, beta, dtype=np.float64)
+    for iteration in range(1, max_iterations + 1):
+        y = beta + alpha * (A @ x)
+        # |x* - y| <= alpha λ |x* - x| <= alpha λ |y - x| / (1 - alpha λ)
+        error = contraction * np.linalg.norm(y - x) / (1 - contraction)
+        x = y
+        order = np.lexsort((codes, -x))
+        if _ranking_certified(x, order, k, error) or error <= tol * np.linalg.norm(x):
+            break
+
+    # the ranking is settled, the returned values come from a conjugate gradient
+    # solve warm-started at the iterate, as in `sparse_katz_centrality`
+    M = sp.identity(graph.n_nodes, format="csr") - alpha * A
+    b = np.full(graph.n_nodes, beta, dtype=np.float64)
+    x, info = spla.cg(M, b, x0=x, rtol=tol, atol=0.0)
+    assert info == 0, f"Katz linear solve did not converge (info={info})"
+    error = np.linalg.norm(b - M @ x) / (1 - contraction)
+    order = np.lexsort((codes, -x))
+
+    norm_x = np.linalg.norm(x)
+    top = order[:k]
+    result = pd.DataFrame(
+        {"Katz": x[top] / norm_x, "Error": error / norm_x},
+        index=[graph.nodes[code] for code in top],
+    )
+    result.attrs["iterations"] = iteration
+    return result
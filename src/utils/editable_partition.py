@@ -0,0 +1,317 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.genres import GenreMatrix
+from src.utils.indexes import ActorIndex, JoinIndex
+
+MAX_AGE = 120
+
+# per-cluster running sums, all of them are updated by `_update`
+CLUSTER_COLUMNS = [
+    "Size",
+    "RevenueSum",
+    "RevenueCount",
+    "TotalRevenue",
+    "MovieCount",
+    "AgeSum",
+    "AgeCount",
+    "FemaleCount",
+    "MaleCount",
+    "TotalAwards",
+    "AwardedActors",
+    "InternalEdges",
+    "DegreeSum",
+]
+
+
+def _group_rows(codes, n_groups, *values):
+    """Sorts values by group code and returns them with the CSR offsets of the groups."""
+    order = np.argsort(codes, kind="stable")
+    offsets = np.searchsorted(codes[order], np.arange(n_groups + 1))
+    return (offsets,) + tuple(value[order] for value in values)
+
+
+class EditablePartition:
+    """
+    A partition of actors that can be edited (move an actor, merge or split
+    clusters) while keeping running sums, counts and histograms for each
+    cluster. An edit only touches the rows of the moved actors, so "what if"
+    hypotheses can be tested without recomputing every statistic.
+    """
+
+    def __init__(self, characters, movies, communities, G=None, actor_awards=None):
+        """
+        Creates an EditablePartition object.
+
+        Parameters
+        ----------
+        characters: pd.DataFrame
+            Pre-processed table with characters metadata
+        movies: pd.DataFrame
+            Pre-processed table with movies metadata
+        communities: list of list
+            Initial partition, each community is a list of Freebase actor IDs
+        G: networkx.Graph, optional
+            Actors graph, required for the modularity contributions
+        actor_awards: DataFrame, optional
+            Table with 'FreebaseActorId' and 'TotalAwards' columns
+        """
+        self.actor_ids = [actor_id for community in communities for actor_id in community]
+        self.actor_codes = {actor_id: code for code, actor_id in enumerate(self.actor_ids)}
+        n_actors = len(self.actor_ids)
+
+        actor_index = ActorIndex(characters, movies)
+        index_codes = actor_index.codes(self.actor_ids)
+        # partition code of every role, -1 for actors outside of the partition
+        to_partition = np.full(len(actor_index.actor_ids) + 1, -1)
+        to_partition[index_codes[index_codes >= 0]] = np.flatnonzero(index_codes >= 0)
+        role_codes = to_partition[actor_index.role_codes]
+
+        # movies of each actor (one entry per role), and mean revenue over them
+        join_index = JoinIndex(movies, characters)
+        pair_codes = role_codes[join_index.role_positions]
+        keep = pair_codes >= 0
+        self.movie_offsets, self.actor_movies = _group_rows(
+            pair_codes[keep], n_actors, join_index.movie_positions[keep]
+        )
+        self.movie_revenues = movies["Revenue"].to_numpy(dtype=np.float64)
+        pair_revenues = self.movie_revenues[self.actor_movies]
+        actor_pairs = np.repeat(np.arange(n_actors), np.diff(self.movie_offsets))
+        known = ~np.isnan(pair_revenues)
+        revenue_sums = np.bincount(actor_pairs[known], weights=pair_revenues[known], minlength=n_actors)
+        revenue_counts = np.bincount(actor_pairs[known], minlength=n_actors)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.actor_revenues = revenue_sums / revenue_counts
+
+        # positive ages at release of all the roles of each actor
+        ages = characters["ActorAgeAtRelease"].to_numpy(dtype=np.float64)
+        keep = (role_codes >= 0) & (ages > 0)
+        self.age_offsets, self.actor_ages = _group_rows(role_codes[keep], n_actors, ages[keep])
+
+        genders = np.full(n_actors, "", dtype=object)
+        genders[index_codes >= 0] = actor_index.actors["ActorGender"].to_numpy()[index_codes[index_codes >= 0]]
+        self.actor_genders = genders
+
+        self.actor_awards = np.zeros(n_actors)
+        if actor_awards is not None:
+            awards = actor_awards.groupby("FreebaseActorId")["TotalAwards"].sum()
+            self.actor_awards = awards.reindex(self.actor_ids, fill_value=0).to_numpy(dtype=np.float64)
+
+        self.n_edges = 0
+        self.neighbor_offsets = np.zeros(n_actors + 1, dtype=np.int64)
+        self.neighbors = np.array([], dtype=np.int64)
+        if G is not None:
+            neighbors = [
+                [self.actor_codes[n] for n in G[actor_id] if n in self.actor_codes]
+                if actor_id in G else []
+                for actor_id in self.actor_ids
+            ]
+            self.neighbor_offsets = np.cumsum([0] + [len(n) for n in neighbors])
+            self.neighbors = np.array([n for nbrs in neighbors for n in nbrs], dtype=np.int64)
+            self.n_edges = len(self.neighbors) // 2
+
+        self.genre_matrix = GenreMatrix(movies)
+        self.labels = np.full(n_actors, -1, dtype=np.int64)
+        self.members = []
+        self.movie_counts = []
+        self.genre_counts = np.zeros((0, len(self.genre_matrix.genres)), dtype=np.int64)
+        self.age_counts = np.zeros((0, MAX_AGE + 1), dtype=np.int64)
+        self._sums = np.zeros((0, len(CLUSTER_COLUMNS)))
+
+        for community in communities:
+            label = self._new_label()
+            for actor_id in community:
+                self._add(self.actor_codes[actor_id], label)
+
+    def _new_label(self):
+        label = len(self.members)
+        if label == self._sums.shape[0]:
+            capacity = max(2 * label, 16)
+            self._sums = np.resize(self._sums, (capacity, len(CLUSTER_COLUMNS)))
+            self._sums[label:] = 0
+            self.genre_counts = np.resize(self.genre_counts, (capacity, self.genre_counts.shape[1]))
+            self.genre_counts[label:] = 0
+            self.age_counts = np.resize(self.age_counts, (capacity, MAX_AGE + 1))
+            self.age_counts[label:] = 0
+        self.members.append(set())
+        self.movie_counts.append({})
+        return label
+
+    def _update(self, actor, label, sign):
+        sums = self._sums[label]
+        sums[0] += sign
+        revenue = self.actor_revenues[actor]
+        if not np.isnan(revenue):
+            sums[1] += sign * revenue
+            sums[2] += sign
+
+        movie_counts = self.movie_counts[label]
+        movies, multiplicities = np.unique(
+            self.actor_movies[self.movie_offsets[actor]:self.movie_offsets[actor + 1]],
+            return_counts=True,
+        )
+        genres = self.genre_matrix.counts
+        for movie, multiplicity in zip(movies.tolist(), multiplicities.tolist()):
+            before = movie_counts.get(movie, 0)
+            after = before + sign * multiplicity
+            if after == 0:
+                del movie_counts[movie]
+            else:
+                movie_counts[movie] = after
+            if (before == 0) != (after == 0):  # the movie enters or leaves the cluster
+                revenue = self.movie_revenues[movie]
+                sums[3] += sign * (0 if np.isnan(revenue) else revenue)
+                sums[4] += sign
+                start, stop = genres.indptr[movie], genres.indptr[movie + 1]
+                self.genre_counts[label, genres.indices[start:stop]] += sign * genres.data[start:stop]
+
+        ages = self.actor_ages[self.age_offsets[actor]:self.age_offsets[actor + 1]]
+        sums[5] += sign * ages.sum()
+        sums[6] += sign * len(ages)
+        np.add.at(self.age_counts[label], np.minimum(ages, MAX_AGE).astype(np.int64), sign)
+
+        sums[7] += sign * (self.actor_genders[actor] == "F")
+        sums[8] += sign * (self.actor_genders[actor] == "M")
+        sums[9] += sign * self.actor_awards[actor]
+        sums[10] += sign * (self.actor_awards[actor] > 0)
+
+        neighbors = self.neighbors[self.neighbor_offsets[actor]:self.neighbor_offsets[actor + 1]]
+        sums[11] += sign * np.count_nonzero(self.labels[neighbors] == label)
+        sums[12] += sign * len(neighbors)
+
+    def _add(self, actor, label):
+        self._update(actor, label, 1)
+        self.labels[actor] = label
+        self.members[label].add(actor)
+
+    def _remove(self, actor):
+        label = self.labels[actor]
+        self.members[label].discard(actor)
+        self.labels[actor] = -1
+        self._update(actor, label, -1)
+
+    def move(self, actor_id, label):
+        """
+        Moves an actor to another cluster.
+
+        Parameters
+        ----------
+        actor_id : str
+            Freebase actor ID
+        label : int
+            Label of the destination cluster
+        """
+        actor = self.actor_codes[actor_id]
+        if self.labels[actor] != label:
+            self._remove(actor)
+            self._add(actor, label)
+
+    def merge(self, label_a, label_b):
+        """
+        Merges cluster `label_b` into cluster `label_a`, `label_b` becomes empty.
+
+        Returns
+        -------
+        int
+            Label of the merged cluster.
+        """
+        for actor in list(self.members[label_b]):
+            self._remove(actor)
+            self._add(actor, label_a)
+        return label_a
+
+    def split(self, label, actor_ids):
+        """
+        Moves some actors of a cluster into a new cluster.
+
+        Parameters
+        ----------
+        label : int
+            Label of the cluster to split
+        actor_ids : list
+            Freebase actor IDs (members of `label`) that form the new cluster
+
+        Returns
+        -------
+        int
+            Label of the new cluster.
+        """
+        new_label = self._new_label()
+        for actor_id in actor_ids:
+            actor = self.actor_codes[actor_id]
+            assert self.labels[actor] == label, f"{actor_id} is not in cluster {label}"
+            self._remove(actor)
+            self._add(actor, new_label)
+        return new_label
+
+    def communities(self):
+        """
+        Gets the current partition, e.g. to build a `Graph` from it.
+
+        Returns
+        -------
+        list of list
+            Non-empty communities ordered by label.
+        """
+        return [
+            [self.actor_ids[actor] for actor in sorted(members)]
+            for members in self.members if len(members) > 0
+        ]
+
+    def statistics(self):
+        """
+        Gets the current statistics of every non-empty cluster.
+
+        Returns
+        -------
+        DataFrame
+            Indexed by cluster label, with the running sums and the derived
+            "MeanRevenue", "MeanAge", "Female", "Male", "AwardDensity" and
+            "Modularity" (contribution of the cluster to the modularity) columns.
+        """
+        stats = pd.DataFrame(self._sums[:len(self.members)], columns=CLUSTER_COLUMNS)
+        stats.index.name = "ClusterLabel"
+        stats = stats[stats["Size"] > 0].copy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats["MeanRevenue"] = stats["RevenueSum"] / stats["RevenueCount"]
+            stats["MeanAge"] = stats["AgeSum"] / stats["AgeCount"]
+            genders = stats["FemaleCount"] + stats["MaleCount"]
+            stats["Female"] = (stats["FemaleCount"] / genders).where(genders > 0, -1)
+            stats["Male"] = (stats["MaleCount"] / genders).where(genders > 0, -1)
+        stats["AwardDensity"] = stats["AwardedActors"] / stats["Size"]
+        if self.n_edges > 0:
+            stats["Modularity"] = (
+                stats["InternalEdges"] / self.n_edges
+                - (stats["DegreeSum"] / (2 * self.n_edges)) ** 2
+            )
+        return stats
+
+    def modularity(self):
+        """Modularity of the current partition (requires the graph)."""
+        return self.statistics()["Modularity"].sum()
+
+    def genres(self, label):
+        """
+        Gets the genre distribution of the movies of a cluster.
+
+        Returns
+        -------
+        dict
+            Genre names mapped to movie counts, sorted by decreasing count
+            (ties in order of first appearance in the whole movies table).
+        """
+        counts = self.genre_counts[label]
+        order = np.flatnonzero(counts)
+        order = order[np.argsort(-counts[order], kind="stable")]
+        return dict(zip(self.genre_matrix.genres[order], counts[order].tolist()))
+
+    def age_histogram(self, label):
+        """
+        Gets the histogram of the ages at release (one-year bins) of a cluster.
+
+        Returns
+        -------
+        numpy.ndarray
+            Number of roles at each age, from 0 to `MAX_AGE` (older ages go to the last bin).
+        """
+        return self.age_counts[label].copy()
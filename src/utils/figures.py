@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import pickle
+import types
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import pandas as pd
+
+HASH_FILE = "figure_hashes.json"
+
+
+class FigureSpec(NamedTuple):
+    """
+    A figure to export: `draw(*args, **kwargs)` draws it with pyplot from
+    precomputed data, without calling `plt.show()`.
+    """
+
+    name: str
+    draw: object
+    args: tuple = ()
+    kwargs: dict = {}
+
+
+def _update_with_code(digest, code):
+    """Adds the bytecode, names and constants of a code object (and of the ones nested in it) to a digest."""
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            _update_with_code(digest, constant)
+        elif isinstance(constant, frozenset):
+            # the iteration order of a set of strings changes between interpreters
+            digest.update(repr(sorted(map(repr, constant))).encode())
+        else:
+            digest.update(repr(constant).encode())
+
+
+def figure_hash(spec):
+    """
+    Hashes the drawing function, including its code, and the input data of a
+    figure, so that editing the function renders the figure again. Changes to
+    the functions it calls are not detected, use `force` in `export_figures`.
+
+    Parameters
+    ----------
+    spec : FigureSpec
+        The figure
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-1 digest.
+    """
+    digest = hashlib.sha1(f"{spec.draw.__module__}.{spec.draw.__qualname__}".encode())
+    if hasattr(spec.draw, "__code__"):
+        _update_with_code(digest, spec.draw.__code__)
+    digest.update(pickle.dumps((spec.args, spec.kwargs), protocol=4))
+    return digest.hexdigest()
+
+
+def _init_worker():
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _render(task):
+    import matplotlib.pyplot as plt
+
+    spec, output_dir, extension, dpi = task
+    before = set(plt.get_fignums())
+    plt.figure()  # drawing functions using the current figure never touch an existing one
+    spec.draw(*spec.args, **spec.kwargs)
+    figures = [
+        plt.figure(number) for number in plt.get_fignums()
+        if number not in before and len(plt.figure(number).axes) > 0
+    ]
+    paths = []
+    for i, figure in enumerate(figures):
+        suffix = "" if len(figures) == 1 else f"_{i + 1}"
+        path = os.path.join(output_dir, f"{spec.name}{suffix}.{extension}")
+        figure.savefig(path, dpi=dpi, bbox_inches="tight")
+        paths.append(path)
+    for number in set(plt.get_fignums()) - before:
+        plt.close(number)
+    return paths
+
+
+def export_figures(specs, output_dir, n_jobs=None, extension="png", dpi=150, force=False):
+    """
+    Renders a set of figures to files, in parallel worker processes using the
+    Agg backend. The hash of the input data of each figure is stored in
+    `output_dir`, figures whose hash did not change (and whose files still
+    exist) are skipped.
+
+    Parameters
+    ----------
+    specs : list of FigureSpec
+        Figures to render, names must be unique. See e.g. `Graph.figure_specs`.
+    output_dir : str
+        Directory of the figure files.
+    n_jobs : int, optional
+        Number of worker processes. If 1, the figures are rendered in the
+        current process (with its backend, figures are closed without being
+        shown). Defaults to the number of CPUs.
+    extension : str, optional
+        File format. Defaults to 'png'.
+    dpi : int, optional
+        Resolution. Defaults to 150.
+    force : bool, optional
+        If True, every figure is rendered. Defaults to False.
+
+    Returns
+    -------
+    DataFrame
+        One row per figure with columns "Name", "Status" ('rendered' or
+        'skipped') and "Paths" (files of the figure, one per pyplot figure).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    hash_path = os.path.join(output_dir, HASH_FILE)
+    stored = {}
+    if os.path.exists(hash_path):
+        with open(hash_path) as f:
+            stored = json.load(f)
+
+    hashes = {spec.name: figure_hash(spec) for spec in specs}
+    to_render = [
+        spec for spec in specs
+        if force
+        or stored.get(spec.name, {}).get("hash") != hashes[spec.name]
+        or not all(os.path.exists(path) for path in stored[spec.name]["paths"])
+    ]
+    tasks = [(spec, output_dir, extension, dpi) for spec in to_render]
+    if n_jobs == 1:
+        results = list(map(_render, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker) as executor:
+            results = list(executor.map(_render, tasks))
+
+    rendered = {spec.name: paths for spec, paths in zip(to_render, results)}
+    for name, paths in rendered.items():
+        stored[name] = {"hash": hashes[name], "paths": paths}
+    with open(hash_path, "w") as f:
+        json.dump(stored, f, indent=2)
+
+    return pd.DataFrame({
+        "Name": [spec.name for spec in specs],
+        "Status": ["rendered" if spec.name in rendered else "skipped" for spec in specs],
+        "Paths": [stored[spec.name]["paths"] for spec in specs],
+    })
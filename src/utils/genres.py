@@ -0,0 +1,97 @@
+import ast
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def _ragged_positions(indptr, rows):
+    """Positions of all the entries of the given CSR rows, row after row."""
+    lengths = indptr[rows + 1] - indptr[rows]
+    starts = np.repeat(indptr[rows] - np.cumsum(lengths) + lengths, lengths)
+    return np.arange(lengths.sum()) + starts, lengths
+
+
+class GenreMatrix:
+    """
+    Sparse movies x genres count matrix. The `Genres` column is parsed only
+    once, histograms of groups of movies are then obtained by sparse products.
+    """
+
+    def __init__(self, movies):
+        """
+        Creates a GenreMatrix object.
+
+        Parameters
+        ----------
+        movies: pd.DataFrame
+            Pre-processed table with movies metadata, rows of the matrix follow its order
+        """
+        genre_index = {}
+        indptr = [0]
+        indices = []
+        counts = []
+        for genres in movies["Genres"]:
+            row = {}
+            for genre in ast.literal_eval(genres).values():
+                genre_id = genre_index.setdefault(genre, len(genre_index))
+                row[genre_id] = row.get(genre_id, 0) + 1
+            indices.extend(row.keys())
+            counts.extend(row.values())
+            indptr.append(len(indices))
+
+        self.genres = np.array(list(genre_index), dtype=object)
+        self.movie_positions = pd.Index(movies["WikipediaId"])
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        # entries are stored in order of appearance (movie order, then genre order)
+        self.counts = sp.csr_matrix(
+            (np.array(counts, dtype=np.int64), self.indices, self.indptr),
+            shape=(len(self.indptr) - 1, len(self.genres)),
+        )
+
+    def movie_rows(self, movie_ids):
+        """Gets the row of each movie (given by Wikipedia ID), -1 if it is unknown."""
+        return self.movie_positions.get_indexer(movie_ids)
+
+    def ranked_genres(self, membership):
+        """
+        Computes the genre histogram of several groups of movies and ranks the
+        genres of each group by decreasing count. Ties are broken by order of
+        first appearance in the group's movies, as a `Counter` sum would do.
+
+        Parameters
+        ----------
+        membership : scipy.sparse.csr_matrix
+            Binary groups x movies matrix (rows of this GenreMatrix).
+
+        Returns
+        -------
+        tuple
+            - scipy.sparse.csr_matrix, the groups x genres histogram.
+            - numpy.ndarray, genre ids ranked group by group.
+            - numpy.ndarray, corresponding counts.
+            - numpy.ndarray, offsets of each group in the two previous arrays.
+        """
+        membership = membership.tocsr()
+        histogram = (membership @ self.counts).tocsr()
+
+        # first appearance of each (group, genre) pair
+        groups = np.repeat(np.arange(membership.shape[0]), np.diff(membership.indptr))
+        positions, lengths = _ragged_positions(self.indptr, membership.indices)
+        pair_groups = np.repeat(groups, lengths)
+        pair_genres = self.indices[positions]
+        pair_keys = pair_groups * len(self.genres) + pair_genres
+        # entry positions follow the movie order, then the genre order inside a movie
+        appearance_order = np.lexsort((positions, pair_keys))
+        keys, first = np.unique(pair_keys[appearance_order], return_index=True)
+        first_appearance = positions[appearance_order][first]
+
+        key_groups = keys // len(self.genres)
+        key_genres = keys % len(self.genres)
+        # the nonzeros of the sorted histogram are exactly the (group, genre) keys, in key order
+        histogram.sort_indices()
+        key_counts = histogram.data
+        ranking = np.lexsort((first_appearance, -key_counts, key_groups))
+        offsets = np.searchsorted(key_groups[ranking], np.arange(membership.shape[0] + 1))
+        return histogram, key_genres[ranking], key_counts[ranking], offsets
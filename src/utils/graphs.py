@@ -1,9 +1,84 @@
 from collections import Counter
 
-import matplotlib.pyplot as plt
 import numpy as np
 
 from src.utils.actors import Cluster
+from src.utils.cluster_table import ClusterTable
+from src.utils.figures import FigureSpec
+from src.utils.lazy import LazyModule
+
+plt = LazyModule("matplotlib.pyplot")
+
+
+def draw_age_distribution(means):
+    plt.hist(means)
+    plt.title("Distribution of mean age at release accross clusters")
+    plt.xlabel("Average age at release")
+    plt.ylabel("Number of clusters")
+
+
+def draw_gender_revenues(male_proportions, gender_mean_revenues, color="#08D9D6"):
+    plt.scatter(male_proportions, gender_mean_revenues, color=color, alpha=0.5)
+    plt.xlabel("Percentage of male actors in the cluster")
+    plt.ylabel("Average movie revenue in dollars")
+    plt.title("Gender proportions VS average revenue")
+
+
+def draw_age_revenues(cluster_ages, ages_mean_revenues, color="#08D9D6"):
+    plt.scatter(cluster_ages, ages_mean_revenues, color=color, alpha=0.5)
+    plt.xlabel("Average age at movie release in the cluster")
+    plt.ylabel("Average movie revenue in dollars")
+    plt.title("Average age in the cluster VS average revenue")
+
+
+def draw_revenue_distribution(means):
+    plt.hist(means)
+    plt.title("Distribution of mean revenue accross clusters")
+    plt.xlabel("Average revenue generated by actors in the cluster")
+    plt.ylabel("Number of clusters")
+
+
+def draw_median_revenue_distribution(medians):
+    plt.hist(medians)
+    plt.title("Distribution of median revenue accross clusters")
+    plt.xlabel("Average revenue generated by actors in the cluster")
+    plt.ylabel("Number of clusters")
+
+
+def draw_gender_distribution(female_percentages):
+    plt.hist(female_percentages, bins=20)
+    plt.title("Gender distribution accross clusters")
+    plt.xlabel("Proportion of female actors")
+    plt.ylabel("Number of clusters")
+
+
+def draw_size_distribution(sizes, log=True):
+    plt.hist(sizes)
+    plt.title("Size distribution of clusters")
+    plt.xlabel("Number of actors")
+    plt.ylabel("Number of clusters")
+    if log:
+        plt.yscale("log")
+
+
+def draw_nth_genre_distribution(nth_genres, n):
+    max_num_values = 40  # keep maximum 40 first genres for readability
+    x = np.arange(min(len(nth_genres), max_num_values))
+    figure = plt.figure(figsize=(10, 5))
+    plt.bar(x, list(nth_genres.values())[:max_num_values])
+    plt.xticks(
+        x, list(nth_genres.keys())[:max_num_values], rotation=90, fontsize=8
+    )
+    suffix = "th"
+    if n == 1:
+        suffix = "st"
+    elif n == 2:
+        suffix = "nd"
+    elif n == 3:
+        suffix = "rd"
+    plt.title(f"Distribution of {n}{suffix} prefered genre across clusters")
+    plt.xlabel(f"{n}{suffix} prefered genre")
+    plt.ylabel("Number of clusters")
 
 
 class Graph:
@@ -12,19 +87,76 @@ class Graph:
     compute and plot specific statistics about it.
     """
 
-    def __init__(self, clusters):
+    def __init__(self, clusters, table=None):
         """
         Creates a Graph object.
+
+        Parameters
+        ----------
+        clusters : list of Cluster
+            The clusters of the graph.
+        table : ClusterTable, optional
+            Table of the whole partition. If None, it is built from the
+            clusters the first time a statistic is requested.
         """
         self.clusters = clusters
+        self._table = table
+        self._statistics = None
+
+    @property
+    def table(self):
+        """ClusterTable holding all the clusters of the graph."""
+        if self._table is None:
+            self._table = ClusterTable(
+                self.clusters[0].characters,
+                self.clusters[0].movies,
+                [cluster.actor_ids for cluster in self.clusters],
+            )
+        return self._table
+
+    @property
+    def statistics(self):
+        """
+        Per-cluster aggregates (see `ClusterTable.statistics`), computed on
+        first access and shared by all the distribution methods.
+        """
+        if self._statistics is None:
+            self._statistics = self.table.statistics()
+        return self._statistics
+
+    def invalidate(self):
+        """Drops the cached statistics of the graph, of its table and of its clusters."""
+        self._statistics = None
+        if self._table is not None:
+            self._table.invalidate()
+        for cluster in self.clusters:
+            cluster.invalidate()
 
     @staticmethod
     def init_from_list_of_lists(characters, movies, communities):
-        clusters = []
-        for community in communities:
-            cluster = Cluster(characters=characters, movies=movies, actor_ids=community)
-            clusters.append(cluster)
-        return Graph(clusters)
+        table = ClusterTable(characters, movies, communities)
+        clusters = [
+            Cluster(characters=characters, movies=movies, actor_ids=community, table=table, label=label)
+            for label, community in enumerate(communities)
+        ]
+        return Graph(clusters, table)
+
+    @staticmethod
+    def init_from_hierarchy(characters, movies, hierarchy, level=-1, resolution=None):
+        """
+        Creates a Graph from one partition of a CommunityHierarchy.
+
+        Parameters
+        ----------
+        hierarchy : CommunityHierarchy
+            Hierarchy computed with `CommunityHierarchy.from_graph`.
+        level : int, optional
+            Dendrogram level to use, negative values count from the coarsest one. Defaults to -1.
+        resolution : float, optional
+            If given, the partition of the resolution sweep is used instead of a level.
+        """
+        communities = hierarchy.communities(level=level, resolution=resolution)
+        return Graph.init_from_list_of_lists(characters, movies, communities)
 
     def age_distribution(self, plot=False):
         """
@@ -41,13 +173,10 @@ class Graph:
         list of float
             A list containing the mean age at release for each cluster in the graph.
         """
-        means = [cluster.cluster_ages() for cluster in self.clusters]
-        means = [np.nanmean(elem) for elem in means if len(elem) > 0]
+        stats = self.statistics
+        means = stats.loc[stats["AgeCount"] > 0, "MeanAge"].tolist()
         if plot:
-            plt.hist(means)
-            plt.title("Distribution of mean age at release accross clusters")
-            plt.xlabel("Average age at release")
-            plt.ylabel("Number of clusters")
+            draw_age_distribution(means)
             plt.show()
         return means
 
@@ -73,19 +202,13 @@ class Graph:
               gender proportions are computed correctly.
             - A list containing the mean revenue for each corresponding cluster.
         """
-        male_proportions = []
-        gender_mean_revenues = []
-        mean_revenues = self.revenue_distribution()
-        for i, cluster in enumerate(self.clusters):
-            male_proportion = cluster.cluster_genders()[0]
-            if male_proportion >= 0: # only keep correctly computed gender proportions
-                male_proportions.append(male_proportion)
-                gender_mean_revenues.append(mean_revenues[i])
+        stats = self.statistics
+        # only keep correctly computed gender proportions
+        stats = stats[stats["Female"] >= 0]
+        male_proportions = stats["Female"].tolist()
+        gender_mean_revenues = stats["MeanRevenue"].tolist()
         if plot:
-            plt.scatter(male_proportions, gender_mean_revenues, color=color, alpha=0.5)
-            plt.xlabel("Percentage of male actors in the cluster")
-            plt.ylabel("Average movie revenue in dollars")
-            plt.title("Gender proportions VS average revenue")
+            draw_gender_revenues(male_proportions, gender_mean_revenues, color)
             plt.show()
         return male_proportions, gender_mean_revenues
 
@@ -111,19 +234,13 @@ class Graph:
               is available.
             - A list containing the mean revenue for each corresponding cluster.
         """
-        cluster_ages = []
-        ages_mean_revenues = []
-        mean_revenues = self.revenue_distribution()
-        for i, cluster in enumerate(self.clusters):
-            ages = cluster.cluster_ages()
-            if len(ages) > 0: # only keep cluster where ages are available
-                cluster_ages.append(np.nanmean(ages))
-                ages_mean_revenues.append(mean_revenues[i])
+        stats = self.statistics
+        # only keep cluster where ages are available
+        stats = stats[stats["AgeCount"] > 0]
+        cluster_ages = stats["MeanAge"].tolist()
+        ages_mean_revenues = stats["MeanRevenue"].tolist()
         if plot:
-            plt.scatter(cluster_ages, ages_mean_revenues, color=color, alpha=0.5)
-            plt.xlabel("Average age at movie release in the cluster")
-            plt.ylabel("Average movie revenue in dollars")
-            plt.title("Average age in the cluster VS average revenue")
+            draw_age_revenues(cluster_ages, ages_mean_revenues, color)
             plt.show()
         return cluster_ages, ages_mean_revenues
 
@@ -142,18 +259,13 @@ class Graph:
         list of float
             A list containing the mean revenue for each cluster in the graph.
         """
-        means = []
-        for cluster in self.clusters:
-            means.append(cluster.cluster_mean_revenue())
+        means = self.statistics["MeanRevenue"].tolist()
         if plot:
-            plt.hist(means)
-            plt.title("Distribution of mean revenue accross clusters")
-            plt.xlabel("Average revenue generated by actors in the cluster")
-            plt.ylabel("Number of clusters")
+            draw_revenue_distribution(means)
             plt.show()
         return means
 
-    def median_revenue_distribution(self, plot=False):
+    def median_revenue_distribution(self, plot=False, approximate=False, k=200):
         """
         Calculates the distribution of median revenue generated by actors across the clusters.
         Optionally, it can plot a histogram of the median revenue distribution across the clusters.
@@ -162,20 +274,23 @@ class Graph:
         ----------
         plot : bool, optional
             If True, a histogram displaying the distribution of median revenue across clusters will be shown. Defaults to False.
+        approximate : bool, optional
+            If True, the medians are read from bounded-memory KLL sketches, see
+            `ClusterTable.median_revenue_sketches`. Defaults to False.
+        k : int, optional
+            Size parameter of the sketches. Defaults to 200.
 
         Returns
         -------
         list of float
             A list containing the median revenue for each cluster in the graph.
         """
-        medians = []
-        for cluster in self.clusters:
-            medians.append(cluster.cluster_median_revenue())
+        if approximate:
+            medians = [sketch.median() for sketch in self.table.median_revenue_sketches(k)]
+        else:
+            medians = self.statistics["MedianRevenue"].tolist()
         if plot:
-            plt.hist(medians)
-            plt.title("Distribution of median revenue accross clusters")
-            plt.xlabel("Average revenue generated by actors in the cluster")
-            plt.ylabel("Number of clusters")
+            draw_median_revenue_distribution(medians)
             plt.show()
         return medians
 
@@ -198,14 +313,11 @@ class Graph:
             - The proportion of male actors (float) in the same cluster.
         """
 
-        female_percentages = [cluster.cluster_genders()[0] for cluster in self.clusters]
+        female_percentages = self.statistics["Female"].tolist()
         # remove -1 from nans
         female_percentages = list(filter(lambda x: x > -1, female_percentages))
         if plot:
-            plt.hist(female_percentages, bins=20)
-            plt.title("Gender distribution accross clusters")
-            plt.xlabel("Proportion of female actors")
-            plt.ylabel("Number of clusters")
+            draw_gender_distribution(female_percentages)
             plt.show()
         return [(p, 1 - p) for p in female_percentages]
 
@@ -236,12 +348,7 @@ class Graph:
         if max_value is not None:
             sizes = list(filter(lambda x: x <= max_value, sizes))
         if plot:
-            plt.hist(sizes)
-            plt.title("Size distribution of clusters")
-            plt.xlabel("Number of actors")
-            plt.ylabel("Number of clusters")
-            if log:
-                plt.yscale("log")
+            draw_size_distribution(sizes, log)
             plt.show()
         return sizes
 
@@ -265,30 +372,39 @@ class Graph:
             A dictionary where keys are genres and values are the counts of clusters that have that genre as the nth most preferred,
             sorted in descending order of counts.
         """
-        nth_genres = []
-        index = n - 1
-        for cluster in self.clusters:
-            cluster_genres = list(cluster.cluster_genres().keys())
-            if len(cluster_genres) > index:
-                nth_genres.append(cluster_genres[index])
-        nth_genres = dict(Counter(nth_genres).most_common())
+        nth_genres = dict(Counter(self.table.nth_genres(n)).most_common())
         if plot:
-            max_num_values = 40  # keep maximum 40 first genres for readability
-            x = np.arange(min(len(nth_genres), max_num_values))
-            figure = plt.figure(figsize=(10, 5))
-            plt.bar(x, list(nth_genres.values())[:max_num_values])
-            plt.xticks(
-                x, list(nth_genres.keys())[:max_num_values], rotation=90, fontsize=8
-            )
-            suffix = "th"
-            if n == 1:
-                suffix = "st"
-            elif n == 2:
-                suffix = "nd"
-            elif n == 3:
-                suffix = "rd"
-            plt.title(f"Distribution of {n}{suffix} prefered genre across clusters")
-            plt.xlabel(f"{n}{suffix} prefered genre")
-            plt.ylabel("Number of clusters")
+            draw_nth_genre_distribution(nth_genres, n)
             plt.show()
         return nth_genres
+
+    def figure_specs(self, nth_genres=(1, 2, 3)):
+        """
+        Declares the figures of the distribution methods with their precomputed
+        data, to be rendered to files by `figures.export_figures`.
+
+        Parameters
+        ----------
+        nth_genres : tuple of int, optional
+            Ranks of the genres of the `nth_genre_distribution` figures. Defaults to (1, 2, 3).
+
+        Returns
+        -------
+        list of FigureSpec
+            One figure per distribution method.
+        """
+        specs = [
+            FigureSpec("age_distribution", draw_age_distribution, (self.age_distribution(),)),
+            FigureSpec("gender_revenues", draw_gender_revenues, self.gender_revenues_graph()),
+            FigureSpec("age_revenues", draw_age_revenues, self.age_revenues_graph()),
+            FigureSpec("revenue_distribution", draw_revenue_distribution, (self.revenue_distribution(),)),
+            FigureSpec("median_revenue_distribution", draw_median_revenue_distribution,
+                       (self.median_revenue_distribution(),)),
+            FigureSpec("gender_distribution", draw_gender_distribution,
+                       ([female for female, _ in self.gender_distribution()],)),
+            FigureSpec("size_distribution", draw_size_distribution, (self.size_distribution(),)),
+        ]
+        for n in nth_genres:
+            specs.append(FigureSpec(f"nth_genre_distribution_{n}", draw_nth_genre_distribution,
+                                    (self.nth_genre_distribution(n), n)))
+        return specs
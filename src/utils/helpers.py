@@ -6,12 +6,16 @@ from collections import Counter, OrderedDict
 from pathlib import Path
 from copy import deepcopy
 
-import community as community_louvain
-import matplotlib.pyplot as plt
-import networkx as nx
 import numpy as np
 import pandas as pd
-import seaborn as sns
+
+from src.utils.indexes import JoinIndex
+from src.utils.lazy import LazyModule
+
+community_louvain = LazyModule("community")
+nx = LazyModule("networkx")
+plt = LazyModule("matplotlib.pyplot")
+sns = LazyModule("seaborn")
 
 
 def set_random_seed(seed=1):
@@ -195,14 +199,29 @@ def plot_top_genres(df, table_name, limit=None):
     plt.show()
 
 
-def merge_movies_and_actors(movies, characters):
-    res = pd.merge(
-        movies, characters, on="WikipediaId", how="inner", suffixes=("", "_duplicate")
-    )
-    res = res[list(set(movies.columns.tolist() + characters.columns.tolist()))]
+def merge_movies_and_actors(movies, characters, columns=None, join_index=None):
+    """
+    Inner join of movies and characters on 'WikipediaId'. Columns present in
+    both tables are taken from `movies`.
+
+    Parameters
+    ----------
+    columns : list of str, optional
+        Columns to keep. Defaults to the movies columns followed by the other
+        characters columns.
+    join_index : JoinIndex, optional
+        Precomputed join positions of these two tables. Built if None.
+    """
+    if columns is None:
+        columns = movies.columns.tolist() + [
+            column for column in characters.columns if column not in movies.columns
+        ]
+    if join_index is None:
+        join_index = JoinIndex(movies, characters)
+    res = join_index.take(movies, characters, columns)
     res.attrs["movies_filter_metadata"] = movies.attrs.get("filter_metadata", [])
     res.attrs["characters_filter_metadata"] = characters.attrs.get("filter_metadata", [])
-    return res.copy()
+    return res
 
 
 def create_graph_from_data(movies_and_characters):
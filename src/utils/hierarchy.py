@@ -0,0 +1,200 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from src.utils.lazy import LazyModule
+
+community_louvain = LazyModule("community")
+
+def _best_partition_at_resolution(G, resolution, seed):
+    return community_louvain.best_partition(G, resolution=resolution, random_state=seed)
+
+
+def split_by_labels(nodes, labels):
+    """
+    Groups nodes into communities given an integer label per node.
+
+    Parameters
+    ----------
+    nodes : numpy.ndarray
+        Array of node identifiers.
+    labels : numpy.ndarray
+        Array of non-negative integer labels aligned with `nodes`.
+
+    Returns
+    -------
+    list of list
+        A list of communities ordered by label. Inside a community, nodes keep
+        their relative order from `nodes`.
+    """
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    return [list(group) for group in np.split(nodes[order], boundaries)]
+
+
+class CommunityHierarchy:
+    """
+    Keeps every level of the Louvain dendrogram and, optionally, partitions
+    obtained for several resolutions. Each partition is stored as an integer
+    label array aligned with `nodes`, so switching granularity does not
+    require re-running the community detection.
+    """
+
+    def __init__(self, nodes, levels, resolutions=None):
+        """
+        Creates a CommunityHierarchy object.
+
+        Parameters
+        ----------
+        nodes : list
+            Node identifiers (Freebase actor IDs), defines the order of the label arrays.
+        levels : list of numpy.ndarray
+            Label arrays, one per dendrogram level, from the finest (0) to the coarsest.
+        resolutions : dict, optional
+            Mapping from a resolution value to the label array of the corresponding partition.
+        """
+        self.nodes = np.array(nodes, dtype=object)
+        self.node_index = {node: i for i, node in enumerate(nodes)}
+        self.levels = [np.asarray(labels, dtype=np.int64) for labels in levels]
+        self.resolutions = {
+            resolution: np.asarray(labels, dtype=np.int64)
+            for resolution, labels in (resolutions or {}).items()
+        }
+        self._communities = {}
+
+    @staticmethod
+    def from_graph(G, seed=1, resolutions=None, n_jobs=None):
+        """
+        Runs the Louvain algorithm on the graph and keeps all the dendrogram levels.
+
+        Parameters
+        ----------
+        G : networkx.Graph
+            The actors graph.
+        seed : int, optional
+            Random state passed to the Louvain algorithm. Defaults to 1.
+        resolutions : list of float, optional
+            If given, `best_partition` is additionally run for each of these
+            resolutions in a process pool. Defaults to None.
+        n_jobs : int, optional
+            Number of worker processes for the resolution sweep. Defaults to the number of CPUs.
+
+        Returns
+        -------
+        CommunityHierarchy
+            The hierarchy. The last level is the partition returned by `get_communities`
+            for the same seed.
+        """
+        nodes = list(G.nodes)
+        dendrogram = community_louvain.generate_dendrogram(G, random_state=seed)
+
+        labels = np.array([dendrogram[0][node] for node in nodes], dtype=np.int64)
+        levels = [labels]
+        for level in dendrogram[1:]:
+            # communities of a level are numbered 0..n-1, so a level is a lookup array
+            mapping = np.array([level[i] for i in range(len(level))], dtype=np.int64)
+            labels = mapping[labels]
+            levels.append(labels)
+
+        sweep = {}
+        if resolutions:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                partitions = executor.map(
+                    _best_partition_at_resolution, repeat(G), resolutions, repeat(seed)
+                )
+                for resolution, partition in zip(resolutions, partitions):
+                    sweep[resolution] = np.array([partition[node] for node in nodes])
+
+        return CommunityHierarchy(nodes, levels, sweep)
+
+    @property
+    def n_levels(self):
+        """Number of levels in the dendrogram."""
+        return len(self.levels)
+
+    def labels(self, level=-1, resolution=None):
+        """
+        Gets the membership array of a partition.
+
+        Parameters
+        ----------
+        level : int, optional
+            Dendrogram level, negative values count from the coarsest one. Defaults to -1.
+        resolution : float, optional
+            If given, the partition of the resolution sweep is used instead of a level.
+
+        Returns
+        -------
+        numpy.ndarray
+            Community label of each node, aligned with `self.nodes`.
+        """
+        if resolution is not None:
+            return self.resolutions[resolution]
+        return self.levels[level]
+
+    def communities(self, level=-1, resolution=None):
+        """
+        Gets a partition as a list of lists of actor IDs, the format expected by
+        `Graph.init_from_list_of_lists` and the awards helpers.
+
+        Parameters
+        ----------
+        level : int, optional
+            Dendrogram level, negative values count from the coarsest one. Defaults to -1.
+        resolution : float, optional
+            If given, the partition of the resolution sweep is used instead of a level.
+
+        Returns
+        -------
+        list of list
+            Communities ordered by their label.
+        """
+        if resolution is not None:
+            key = ("resolution", resolution)
+        else:
+            key = ("level", level % self.n_levels)
+        if key not in self._communities:
+            self._communities[key] = split_by_labels(
+                self.nodes, self.labels(level, resolution)
+            )
+        return self._communities[key]
+
+    def partition(self, level=-1, resolution=None):
+        """
+        Gets a partition as a dictionary, in the format of `community_louvain.best_partition`.
+
+        Returns
+        -------
+        dict
+            Mapping from node to community label.
+        """
+        return dict(zip(self.nodes, self.labels(level, resolution).tolist()))
+
+    def sizes(self, level=-1, resolution=None):
+        """
+        Gets the number of actors of each community of a partition.
+
+        Returns
+        -------
+        numpy.ndarray
+            Size of the community with label i at position i.
+        """
+        return np.bincount(self.labels(level, resolution))
+
+    def labels_of(self, actor_ids, level=-1, resolution=None):
+        """
+        Gets the community labels of the given actors.
+
+        Parameters
+        ----------
+        actor_ids : list
+            Freebase actor IDs, all of them must be nodes of the graph.
+
+        Returns
+        -------
+        numpy.ndarray
+            Community label of each actor.
+        """
+        positions = np.array([self.node_index[actor_id] for actor_id in actor_ids], dtype=np.int64)
+        return self.labels(level, resolution)[positions]
@@ -0,0 +1,209 @@
+from copy import copy
+
+import numpy as np
+import pandas as pd
+
+ACTOR_COLUMNS = [
+    "FreebaseActorId",
+    "ActorName",
+    "ActorGender",
+    "ActorDateOfBirth",
+    "ActorHeight",
+    "ActorEthnicity",
+]
+
+
+class ActorIndex:
+    """
+    Precomputed lookups from an actor to the rows of its roles in `characters`
+    and from a movie to its rows in `movies`, so that per-actor queries are
+    slices instead of full boolean scans.
+
+    Each actor gets an integer code, `role_codes` gives the code of every role
+    and `actors` is the deduplicated actor table (one row per code, attributes
+    taken from the first role of the actor).
+    """
+
+    def __init__(self, characters, movies):
+        """
+        Creates an ActorIndex object.
+
+        Parameters
+        ----------
+        characters: pd.DataFrame
+            Pre-processed table with characters metadata
+        movies: pd.DataFrame
+            Pre-processed table with movies metadata
+        """
+        codes, actor_ids = pd.factorize(characters["FreebaseActorId"])
+        self.actor_ids = actor_ids
+        self.actor_codes = {actor_id: code for code, actor_id in enumerate(actor_ids)}
+        self.role_codes = codes
+
+        # roles grouped by actor, keeping the original order inside a group
+        order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+        self.role_positions = order
+        self.role_offsets = np.searchsorted(codes[order], np.arange(len(actor_ids) + 1))
+
+        columns = [column for column in ACTOR_COLUMNS if column in characters.columns]
+        self.actors = characters[columns].iloc[order[self.role_offsets[:-1]]].set_axis(
+            pd.RangeIndex(len(actor_ids), name="ActorCode")
+        )
+
+        self.role_movie_ids = characters["WikipediaId"].to_numpy()
+        self.movie_rows = movies.groupby("WikipediaId", sort=False).indices
+
+    def codes(self, actor_ids):
+        """
+        Gets the integer codes of several actors.
+
+        Parameters
+        ----------
+        actor_ids : list
+            Freebase actor IDs
+
+        Returns
+        -------
+        numpy.ndarray
+            Code of each actor, -1 for unknown actors.
+        """
+        return self.actor_ids.get_indexer(actor_ids)
+
+    def attribute(self, actor_ids, column):
+        """
+        Gets an actor-level attribute (name, gender, date of birth, ...) of several actors.
+
+        Parameters
+        ----------
+        actor_ids : list
+            Freebase actor IDs
+        column : str
+            Column of `actors`, e.g. 'ActorGender'
+
+        Returns
+        -------
+        numpy.ndarray
+            Value of the attribute for each known actor, unknown actors are dropped.
+        """
+        codes = self.codes(actor_ids)
+        return self.actors[column].to_numpy()[codes[codes >= 0]]
+
+    def roles(self, actor_id):
+        """
+        Gets the positions in `characters` of all the roles of an actor.
+
+        Parameters
+        ----------
+        actor_id : str
+            Freebase actor ID
+
+        Returns
+        -------
+        numpy.ndarray
+            Row positions, in the order of `characters` (empty for an unknown actor).
+        """
+        code = self.actor_codes.get(actor_id)
+        if code is None:
+            return self.role_positions[:0]
+        return self.role_positions[self.role_offsets[code]:self.role_offsets[code + 1]]
+
+    def movies(self, actor_id):
+        """
+        Gets the positions in `movies` of all the movies an actor played in.
+
+        Parameters
+        ----------
+        actor_id : str
+            Freebase actor ID
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted row positions, each movie appears once.
+        """
+        rows = [
+            self.movie_rows[movie_id]
+            for movie_id in self.role_movie_ids[self.roles(actor_id)]
+            if movie_id in self.movie_rows
+        ]
+        if len(rows) == 0:
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate(rows))
+
+
+class JoinIndex:
+    """
+    Row positions of the inner join of `movies` and `characters` on
+    'WikipediaId'. Joined views are then built by taking only the requested
+    columns at these positions, without materializing the full merge.
+    """
+
+    def __init__(self, movies, characters):
+        """
+        Creates a JoinIndex object.
+
+        Parameters
+        ----------
+        movies: pd.DataFrame
+            Pre-processed table with movies metadata
+        characters: pd.DataFrame
+            Pre-processed table with characters metadata
+        """
+        positions = pd.merge(
+            pd.DataFrame({"WikipediaId": movies["WikipediaId"].to_numpy(), "MovieRow": np.arange(len(movies))}),
+            pd.DataFrame({"WikipediaId": characters["WikipediaId"].to_numpy(), "RoleRow": np.arange(len(characters))}),
+            on="WikipediaId",
+            how="inner",
+        )
+        self.movie_positions = positions["MovieRow"].to_numpy()
+        self.role_positions = positions["RoleRow"].to_numpy()
+
+    def __len__(self):
+        return len(self.movie_positions)
+
+    def select(self, pairs):
+        """
+        Keeps a subset of the joined pairs.
+
+        Parameters
+        ----------
+        pairs : numpy.ndarray
+            Positions of the pairs to keep, in the desired order.
+
+        Returns
+        -------
+        JoinIndex
+            A new index over the same tables.
+        """
+        selected = copy(self)
+        selected.movie_positions = self.movie_positions[pairs]
+        selected.role_positions = self.role_positions[pairs]
+        return selected
+
+    def take(self, movies, characters, columns):
+        """
+        Builds the joined table for the given columns.
+
+        Parameters
+        ----------
+        movies: pd.DataFrame
+            The movies table the index was built on
+        characters: pd.DataFrame
+            The characters table the index was built on
+        columns: list of str
+            Columns to keep. Columns present in both tables are taken from `movies`.
+
+        Returns
+        -------
+        DataFrame
+            One row per (movie, role) pair, in the order of `pd.merge`.
+        """
+        parts = []
+        for column in columns:
+            if column in movies.columns:
+                values = movies[column].iloc[self.movie_positions]
+            else:
+                values = characters[column].iloc[self.role_positions]
+            parts.append(values.reset_index(drop=True))
+        return pd.concat(parts, axis=1) if parts else pd.DataFrame(index=pd.RangeIndex(len(self)))
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.utils.csr_graph import CSRGraph, graph_fingerprint
+from src.utils.genres import _ragged_positions
+
+LAYOUT_CACHE_DIR = "data/processed/layouts"
+MIN_DISTANCE = 0.01  # as in nx.spring_layout
+
+# cells of the 6 x 6 block around the parent cell, relative to 2 * parent
+_BLOCK_OFFSETS = np.array([(dx, dy) for dx in range(-2, 4) for dy in range(-2, 4)])
+_NEIGHBOR_OFFSETS = np.array([(dx, dy) for dx in range(-1, 2) for dy in range(-1, 2)])
+
+
+def _repulsion(delta, distance2, k):
+    """Fruchterman-Reingold repulsion k^2 / d along delta."""
+    return delta * (k * k / distance2)[..., None]
+
+
+def _far_field(positions, cells, level, n_levels, k):
+    """
+    Repulsion of the cells well separated from each node at one level of the
+    quadtree: children of the neighbors of the parent cell that are not
+    neighbors of the node cell. Each cell acts as its total mass at its centroid.
+    """
+    size = 2 ** level
+    coordinates = cells >> (n_levels - level)
+    flat = coordinates[:, 0] * size + coordinates[:, 1]
+    mass = np.bincount(flat, minlength=size * size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centroids = np.stack([
+            np.bincount(flat, weights=positions[:, axis], minlength=size * size) / mass
+            for axis in range(2)
+        ], axis=1)
+
+    candidates = 2 * (coordinates[:, None, :] // 2) + _BLOCK_OFFSETS[None, :, :]
+    valid = (
+        (candidates >= 0).all(axis=2) & (candidates < size).all(axis=2)
+        & (np.abs(candidates - coordinates[:, None, :]).max(axis=2) > 1)
+    )
+    candidate_cells = np.where(valid, candidates[:, :, 0] * size + candidates[:, :, 1], 0)
+    weights = np.where(valid, mass[candidate_cells], 0)
+    delta = positions[:, None, :] - np.nan_to_num(centroids[candidate_cells])
+    distance2 = np.maximum((delta ** 2).sum(axis=2), MIN_DISTANCE ** 2)
+    return (weights[..., None] * _repulsion(delta, distance2, k)).sum(axis=1)
+
+
+def _near_field(positions, cells, n_levels, k):
+    """Exact repulsion between nodes in the same or adjacent cells of the finest level."""
+    n = len(positions)
+    size = 2 ** n_levels
+    flat = cells[:, 0] * size + cells[:, 1]
+    order = np.argsort(flat, kind="stable")
+    # two empty sentinel cells at the end, for neighbors outside of the grid
+    offsets = np.searchsorted(flat[order], np.arange(size * size + 2))
+    displacement = np.zeros((n, 2))
+    for offset in _NEIGHBOR_OFFSETS:
+        neighbors = cells + offset
+        inside = (neighbors >= 0).all(axis=1) & (neighbors < size).all(axis=1)
+        neighbor_cells = np.where(inside, neighbors[:, 0] * size + neighbors[:, 1], size * size)
+        positions_in_cells, lengths = _ragged_positions(offsets, neighbor_cells)
+        i = np.repeat(np.arange(n), lengths)
+        j = order[positions_in_cells]
+        i, j = i[i != j], j[i != j]
+        delta = positions[i] - positions[j]
+        distance2 = np.maximum((delta ** 2).sum(axis=1), MIN_DISTANCE ** 2)
+        force = _repulsion(delta, distance2, k)
+        for axis in range(2):
+            displacement[:, axis] += np.bincount(i, weights=force[:, axis], minlength=n)
+    return displacement
+
+
+def force_layout(graph, k=None, iterations=50, seed=1):
+    """
+    Computes a Fruchterman-Reingold layout (the model of `nx.spring_layout`)
+    with Barnes-Hut style approximate repulsion: positions are binned in a
+    quadtree of regular grids, nodes in adjacent cells of the finest grid
+    repel each other exactly, and farther cells act as a single mass at their
+    centroid. Each iteration costs O(n log n + m) instead of O(n^2).
+
+    Parameters
+    ----------
+    graph : CSRGraph
+        The graph
+    k : float, optional
+        Optimal distance between nodes. Defaults to 1 / sqrt(n).
+    iterations : int, optional
+        Number of iterations (the cooling schedule follows them). Defaults to 50.
+    seed : int, optional
+        Seed of the random initial positions. Defaults to 1.
+
+    Returns
+    -------
+    numpy.ndarray
+        Positions of shape (n, 2), centered and rescaled to [-1, 1] like networkx.
+    """
+    n = graph.n_nodes
+    if n == 0:
+        return np.zeros((0, 2))
+    if n == 1:
+        return np.zeros((1, 2))
+    k = np.sqrt(1.0 / n) if k is None else k
+    # about 4 nodes per cell of the finest grid
+    n_levels = int(min(max(np.ceil(np.log(n / 4) / np.log(4)), 1), 10))
+    positions = np.random.default_rng(seed).random((n, 2))
+    sources = np.repeat(np.arange(n), np.diff(graph.indptr))
+    targets = graph.indices
+
+    temperature = 0.1 * np.ptp(positions, axis=0).max()
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        low = positions.min(axis=0)
+        extent = max(np.ptp(positions, axis=0).max(), 1e-12)
+        cells = np.minimum(((positions - low) / extent * 2 ** n_levels).astype(np.int64), 2 ** n_levels - 1)
+
+        displacement = _near_field(positions, cells, n_levels, k)
+        for level in range(2, n_levels + 1):
+            displacement += _far_field(positions, cells, level, n_levels, k)
+
+        delta = positions[sources] - positions[targets]
+        distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), MIN_DISTANCE)
+        attraction = delta * (distance / k)[:, None]
+        for axis in range(2):
+            displacement[:, axis] -= np.bincount(sources, weights=attraction[:, axis], minlength=n)
+
+        length = np.sqrt((displacement ** 2).sum(axis=1))
+        length = np.where(length < MIN_DISTANCE, 0.1, length)
+        positions += displacement * (temperature / length)[:, None]
+        temperature -= cooling
+
+    positions -= positions.mean(axis=0)
+    limit = np.abs(positions).max()
+    return positions / limit if limit > 0 else positions
+
+
+def cached_layout(G, k=None, iterations=50, seed=1, cache_dir=None):
+    """
+    Gets the `force_layout` of a graph, optionally stored on disk keyed by
+    the graph fingerprint and the layout parameters, so that restyling a
+    figure does not recompute it. Directed graphs are laid out as undirected,
+    edge weights are ignored.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        The graph
+    k, iterations, seed
+        Parameters of `force_layout`.
+    cache_dir : str, optional
+        Directory of the stored layouts, e.g. `LAYOUT_CACHE_DIR`. Defaults to
+        None: the layout is recomputed and nothing is written.
+
+    Returns
+    -------
+    dict
+        Position (numpy.ndarray of shape (2,)) of each node, as `nx.spring_layout`.
+    """
+    graph = CSRGraph.from_networkx(G.to_undirected(as_view=True) if G.is_directed() else G)
+    path = None
+    if cache_dir is not None:
+        key = json.dumps({"k": k, "iterations": iterations, "seed": seed}, sort_keys=True)
+        digest = hashlib.sha1((graph_fingerprint(graph) + key).encode()).hexdigest()
+        path = os.path.join(cache_dir, f"layout_{digest[:20]}.pkl")
+
+    if path is not None and os.path.exists(path):
+        positions = pd.read_pickle(path).reindex(graph.nodes)
+    else:
+        positions = pd.DataFrame(force_layout(graph, k, iterations, seed), index=graph.nodes, columns=["x", "y"])
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            positions.to_pickle(path)
+    return dict(zip(graph.nodes, positions.to_numpy()))
@@ -0,0 +1,35 @@
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stands for a module that is only imported on first attribute access, so
+    that heavy optional dependencies (plotting, community detection, sklearn,
+    downloads) do not slow down importing the modules that use them.
+
+    Used in place of the import statement, e.g.
+    `plt = LazyModule("matplotlib.pyplot")` instead of `import matplotlib.pyplot as plt`.
+    """
+
+    def __init__(self, name):
+        """
+        Creates a LazyModule object.
+
+        Parameters
+        ----------
+        name : str
+            Absolute name of the module, e.g. 'matplotlib.pyplot'
+        """
+        super().__init__(name)
+
+    def __getattr__(self, attr):
+        # only called for attributes missing from the proxy, import_module
+        # returns the module from sys.modules after the first call
+        return getattr(importlib.import_module(self.__name__), attr)
+
+    def __dir__(self):
+        return dir(importlib.import_module(self.__name__))
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name__}'>"
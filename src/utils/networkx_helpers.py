@@ -1,19 +1,65 @@
 import networkx as nx
 import numpy as np
-import matplotlib.pyplot as plt
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
 
-def katz_centrality(G, verbose=True):
+from src.utils import csr_graph
+from src.utils.layout import cached_layout
+from src.utils.lazy import LazyModule
+from src.utils.raster import render_graph_raster
+
+plt = LazyModule("matplotlib.pyplot")
+
+
+def sparse_katz_centrality(G, alpha_fraction=0.9, beta=1.0, tol=1e-10):
+    """
+    Computes the Katz centrality by solving (I - alpha A) x = beta with a sparse
+    iterative solver (conjugate gradient), alpha being a fraction of 1 / λ_max.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        Undirected input graph.
+    alpha_fraction : float, optional
+        alpha = alpha_fraction / λ_max, must be in (0, 1) for the series to converge. Defaults to 0.9.
+    beta : float, optional
+        Constant attenuation term. Defaults to 1.
+    tol : float, optional
+        Relative tolerance of the solver. Defaults to 1e-10.
+
+    Returns
+    -------
+    dict
+        Katz centrality of each node, normalized to unit Euclidean norm as in networkx.
+    """
+    assert 0 < alpha_fraction < 1, "alpha_fraction must be in (0, 1)"
+    nodes = list(G.nodes)
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=None, dtype=np.float64, format="csr")
+    largest = csr_graph.largest_eigenvalue(A)
+    alpha = alpha_fraction / largest if largest > 0 else alpha_fraction
+    # I - alpha A is symmetric positive definite since alpha * λ_max < 1
+    M = sp.identity(len(nodes), format="csr") - alpha * A
+    x, info = spla.cg(M, np.full(len(nodes), beta), rtol=tol, atol=0.0)
+    assert info == 0, f"Katz linear solve did not converge (info={info})"
+    x = x / np.linalg.norm(x)
+    return dict(zip(nodes, x.tolist()))
+
+
+def katz_centrality(G, verbose=True, alpha_fraction=0.9):
     """
     Computes the Katz centrality for all nodes in the graph and assigns the computed 
     values as node attributes. Also prints the top 5 nodes with the highest Katz centrality.
 
-    Katz centrality is calculated using an alpha value slightly below the reciprocal 
-    of the largest eigenvalue of the graph's adjacency matrix.
+    Katz centrality is calculated with alpha set to a fraction of the reciprocal
+    of the largest eigenvalue of the graph's adjacency matrix, which is estimated
+    with a sparse Lanczos solver (see `sparse_katz_centrality`).
 
     Parameters
     ----------
     G : networkx.Graph
         The input graph for which the Katz centrality is to be computed.
+    alpha_fraction : float, optional
+        alpha = alpha_fraction / λ_max. Defaults to 0.9.
 
     Returns
     -------
@@ -27,11 +73,7 @@ def katz_centrality(G, verbose=True):
       accessible via `G.nodes[node]['katz']`.
     - Prints the names and Katz centrality scores of the top 5 nodes with the highest scores.
     """
-    # Compute largest eigenvalue
-    largest_eigenvalue = max(abs(np.linalg.eigvals(nx.adjacency_matrix(G).todense())))
-    # Set alpha slightly below 1 / λ_max
-    alpha = 1 / largest_eigenvalue - 0.01
-    katz = nx.katz_centrality(G, alpha=alpha)
+    katz = sparse_katz_centrality(G, alpha_fraction=alpha_fraction)
     nx.set_node_attributes(G, katz, 'katz')
     sorted_katz = sorted(katz.items(), key=lambda x: x[1], reverse=True)
     if verbose:
@@ -40,18 +82,26 @@ def katz_centrality(G, verbose=True):
     return katz
 
 
-def closeness_centrality(G, verbose=True):
+def closeness_centrality(G, verbose=True, k=None, seed=1, n_jobs=None):
     """
     Computes the closeness centrality for all nodes in the graph and assigns the computed 
     values as node attributes. Also prints the top 5 nodes with the highest closeness centrality.
 
     Closeness centrality measures how efficiently a node can reach all other nodes 
-    in the graph.
+    in the graph. The BFS run in parallel over CSR arrays, see `csr_graph.closeness_centrality`.
 
     Parameters
     ----------
     G : networkx.Graph
         The input graph for which the closeness centrality is to be computed.
+    k : int, optional
+        If given, the closeness is estimated from k sampled pivots and the half-widths
+        of the 95% confidence intervals are stored in the 'closeness_error' node attribute.
+    seed : int, optional
+        Seed of the pivot sampling. Defaults to 1.
+    n_jobs : int, optional
+        Number of worker processes. Defaults to the number of CPUs, or to 1
+        for graphs of less than `csr_graph.SERIAL_MAX_NODES` nodes.
 
     Returns
     -------
@@ -65,15 +115,24 @@ def closeness_centrality(G, verbose=True):
       accessible via `G.nodes[node]['closeness']`.
     - Prints the names and closeness centrality scores of the top 5 nodes with the highest scores.
     """
-    closeness = nx.closeness_centrality(G) 
+    estimates = csr_graph.closeness_centrality(csr_graph.CSRGraph.from_networkx(G), k=k, seed=seed, n_jobs=n_jobs)
+    closeness = estimates["Closeness"].to_dict()
     nx.set_node_attributes(G, closeness, 'closeness')
+    if k is not None:
+        errors = estimates["Error"].to_dict()
+        nx.set_node_attributes(G, errors, 'closeness_error')
+        if verbose:
+            print('Estimated from %d pivots' %estimates.attrs['samples'])
     sorted_closeness = sorted(closeness.items(), key=lambda x: x[1], reverse=True)
     if verbose:
         for actor, closec in sorted_closeness[:5]:
-            print(G.nodes[actor]['Name'], 'has closeness-centrality: %.3f' %closec)
+            if k is None:
+                print(G.nodes[actor]['Name'], 'has closeness-centrality: %.3f' %closec)
+            else:
+                print(G.nodes[actor]['Name'], 'has closeness-centrality: %.3f ± %.3f' %(closec, errors[actor]))
     return closeness
 
-def betweenness_centrality(G, verbose=True):
+def betweenness_centrality(G, verbose=True, k=None, adaptive=False, seed=1, n_jobs=None):
     """
     Computes the betweenness centrality for all nodes in the graph and assigns the computed 
     values as node attributes. Also prints the top 5 nodes with the highest betweenness centrality.
@@ -85,6 +144,18 @@ def betweenness_centrality(G, verbose=True):
     ----------
     G : networkx.Graph
         The input graph for which the betweenness centrality is to be computed.
+    k : int, optional
+        If given, the betweenness is estimated from k sampled source pivots with
+        `csr_graph.betweenness_centrality`, in parallel, and the half-widths of the
+        95% confidence intervals are stored in the 'betweenness_error' node attribute.
+    adaptive : bool, optional
+        If True, pivots are sampled until the top 5 ranking is stable (at most k
+        if given). Defaults to False.
+    seed : int, optional
+        Seed of the pivot sampling. Defaults to 1.
+    n_jobs : int, optional
+        Number of worker processes of the sampled mode. Defaults to the number
+        of CPUs, or to 1 for graphs of less than `csr_graph.SERIAL_MAX_NODES` nodes.
 
     Returns
     -------
@@ -98,14 +169,65 @@ def betweenness_centrality(G, verbose=True):
       accessible via `G.nodes[node]['betweenness']`.
     - Prints the names and betweenness centrality scores of the top 5 nodes with the highest scores.
     """
-    bet_centrality = nx.betweenness_centrality(G, normalized = True, endpoints = False) 
+    if k is None and not adaptive:
+        bet_centrality = nx.betweenness_centrality(G, normalized = True, endpoints = False) 
+        errors = None
+    else:
+        estimates = csr_graph.betweenness_centrality(
+            csr_graph.CSRGraph.from_networkx(G), k=k, seed=seed, n_jobs=n_jobs, adaptive=adaptive, top_k=5
+        )
+        bet_centrality = estimates["Betweenness"].to_dict()
+        errors = estimates["Error"].to_dict()
+        nx.set_node_attributes(G, errors, 'betweenness_error')
+        if verbose:
+            print('Estimated from %d pivots' %estimates.attrs['samples'])
     nx.set_node_attributes(G, bet_centrality, 'betweenness')
     sorted_betweenness = sorted(bet_centrality.items(), key=lambda x: x[1], reverse=True)
     if verbose:
         for actor, betc in sorted_betweenness[:5]:
-            print(G.nodes[actor]['Name'], 'has betweenness-centrality: %.3f' %betc)
+            if errors is None:
+                print(G.nodes[actor]['Name'], 'has betweenness-centrality: %.3f' %betc)
+            else:
+                print(G.nodes[actor]['Name'], 'has betweenness-centrality: %.3f ± %.3f' %(betc, errors[actor]))
     return bet_centrality
 
+def top_k_centrality(G, metric="closeness", k=10, verbose=True):
+    """
+    Finds the k most central nodes of the graph without computing the centrality
+    of every node, see `csr_graph.top_k_closeness` and `csr_graph.top_k_katz`.
+    The nodes are the same, in the same order, as with the full computation.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        The input graph.
+    metric : str, optional
+        'closeness' or 'katz'. Defaults to 'closeness'.
+    k : int, optional
+        Number of nodes. Defaults to 10.
+
+    Returns
+    -------
+    DataFrame
+        Indexed by node, with the centrality in a "Closeness" or "Katz" column,
+        sorted by decreasing centrality.
+
+    Notes
+    -----
+    - Prints the names and centrality scores of the k nodes.
+    """
+    graph = csr_graph.CSRGraph.from_networkx(G)
+    if metric == "closeness":
+        top = csr_graph.top_k_closeness(graph, k=k)
+    elif metric == "katz":
+        top = csr_graph.top_k_katz(graph, k=k)
+    else:
+        raise ValueError(f"Unknown centrality: {metric}")
+    if verbose:
+        for actor, value in top.iloc[:, 0].items():
+            print(G.nodes[actor]['Name'], 'has %s-centrality: %.3f' %(metric, value))
+    return top
+
 def importance(G, bet_centrality, closeness, katz):
     """
     Computes a combined centrality score for each node in the graph by averaging 
@@ -136,23 +258,29 @@ def importance(G, bet_centrality, closeness, katz):
     Notes
     -----
     - The combined centrality values are averaged and normalized between 0 and 1.
+    - `centrality.CentralityEngine` computes the same score as a DataFrame and caches
+      the centralities on disk.
     - The `centrality` values are added as node attributes in the input graph.
     - Prints the names and combined centrality scores of the top 5 nodes with the highest scores.
     """
-    centrality = (np.array(list(bet_centrality.values())) + np.array(list(closeness.values())) + np.array(list(katz.values()))) / 3
+    nodes = list(G.nodes)
+    # look the scores up by node, the dicts may not follow the order of G.nodes
+    centrality = np.array([[bet_centrality[node], closeness[node], katz[node]] for node in nodes]).mean(axis=1)
     centrality = centrality / centrality.max() # Normalize between 0 and 1
-    centrality = dict(zip(list(G.nodes), centrality))
+    centrality = dict(zip(nodes, centrality))
     nx.set_node_attributes(G, centrality, 'centrality')
     sorted_centrality = sorted(centrality.items(), key=lambda x: x[1], reverse=True)
     
     for actor, c in sorted_centrality[:5]:
         print(G.nodes[actor]['Name'], 'has centrality: %.3f' %c)
 
-def visualize_graph(G, output_path, colors=["#252A34", "#FF2E63", "#08D9D6"], k=None, alpha=1.0, node_shape='o'):
+def visualize_graph(G, output_path, colors=["#252A34", "#FF2E63", "#08D9D6"], k=None, alpha=1.0, node_shape='o',
+                    iterations=50, seed=1, layout_cache_dir=None, mode='artists', communities=None):
     """
     Visualizes the graph with node and edge attributes, saving the visualization to a file.
 
-    The function generates a network visualization using a spring layout, where node sizes and 
+    The function generates a network visualization using a force-directed layout
+    (`layout.cached_layout`, optionally stored on disk), where node sizes and 
     label font sizes are determined by the 'centrality' attribute. The graph is customized with 
     different colors for nodes, edges, and labels. The output is saved as an image file at the specified 
     path and also displayed.
@@ -172,6 +300,19 @@ def visualize_graph(G, output_path, colors=["#252A34", "#FF2E63", "#08D9D6"], k=
         The transparency level of the edges, where 1.0 is fully opaque. Defaults to 1.0.
     node_shape : str, optional
         The shape of the nodes in the visualization (e.g., 'o' for circles). Defaults to 'o'.
+    iterations : int, optional
+        Number of iterations of the layout. Defaults to 50.
+    seed : int, optional
+        Seed of the layout. Defaults to 1.
+    layout_cache_dir : str, optional
+        Directory of the stored layouts, e.g. `layout.LAYOUT_CACHE_DIR`. Defaults to None
+        (the layout is recomputed and nothing is written).
+    mode : str, optional
+        'artists' (default) draws every node, edge and label with matplotlib. 'raster'
+        writes a density-shaded PNG directly (`raster.render_graph_raster`), for whole-network
+        overviews; labels and centrality are not drawn and nothing is displayed.
+    communities : list of list, optional
+        Partition of the nodes used to color them in 'raster' mode.
 
     Returns
     -------
@@ -185,8 +326,12 @@ def visualize_graph(G, output_path, colors=["#252A34", "#FF2E63", "#08D9D6"], k=
     - The 'centrality' values also control the transparency of the nodes and labels.
     - The graph is saved as an image file to the given `output_path`.
     """
+    pos = cached_layout(G, k=k, iterations=iterations, seed=seed, cache_dir=layout_cache_dir)
+    if mode == 'raster':
+        render_graph_raster(G, output_path, communities=communities, pos=pos,
+                            edge_color=colors[1], node_color=colors[2])
+        return
     fig = plt.figure(figsize=(19.2, 10.8))
-    pos = nx.spring_layout(G, k=k)
     font_sizes = {actor_id:int(centrality*15) for actor_id, centrality in nx.get_node_attributes(G, 'centrality').items()}
     lab = nx.draw_networkx_labels(G, pos, labels=nx.get_node_attributes(G, 'Name'),
                                  font_color=colors[0], font_size=font_sizes, alpha=nx.get_node_attributes(G, 'centrality'))
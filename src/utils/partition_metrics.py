@@ -0,0 +1,225 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+_worker_labels = None
+
+
+def partitions_to_labels(communities_list, nodes=None):
+    """
+    Converts several partitions of the same actors into a label matrix.
+
+    Parameters
+    ----------
+    communities_list : list
+        List of partitions, each one is a list of communities (lists of actor IDs),
+        e.g. the output of `read_communities` for several seeds.
+    nodes : list, optional
+        Order of the actors in the label matrix. Defaults to the actors of the first
+        partition, community by community.
+
+    Returns
+    -------
+    tuple
+        - numpy.ndarray of the actor IDs.
+        - numpy.ndarray of shape (number of partitions, number of actors) with the
+          community label of each actor in each partition.
+    """
+    if nodes is None:
+        nodes = [node for community in communities_list[0] for node in community]
+    node_index = {node: i for i, node in enumerate(nodes)}
+
+    labels = np.full((len(communities_list), len(nodes)), -1, dtype=np.int64)
+    for p, communities in enumerate(communities_list):
+        for label, community in enumerate(communities):
+            labels[p, [node_index[node] for node in community]] = label
+    assert (labels >= 0).all(), "All partitions must cover the same actors"
+    return np.array(nodes, dtype=object), labels
+
+
+def contingency_table(labels_a, labels_b):
+    """
+    Builds the sparse contingency table of two partitions.
+
+    Parameters
+    ----------
+    labels_a : numpy.ndarray
+        Community labels (0..k_a-1) of each actor in the first partition.
+    labels_b : numpy.ndarray
+        Community labels (0..k_b-1) of each actor in the second partition.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Matrix of shape (k_a, k_b), entry (i, j) is the number of actors that are
+        in community i of the first partition and in community j of the second one.
+    """
+    shape = (labels_a.max() + 1, labels_b.max() + 1)
+    ones = np.ones(labels_a.shape[0], dtype=np.int64)
+    table = sp.csr_matrix((ones, (labels_a, labels_b)), shape=shape)
+    table.sum_duplicates()
+    return table
+
+
+def _entropy(counts, n):
+    p = counts[counts > 0] / n
+    return -np.sum(p * np.log(p))
+
+
+def _comb2(x):
+    x = x.astype(np.float64)
+    return x * (x - 1) / 2
+
+
+def best_match_jaccard(table):
+    """
+    For each community of the first partition, gets the Jaccard index with the
+    most similar community of the second partition.
+
+    Parameters
+    ----------
+    table : scipy.sparse.csr_matrix
+        Contingency table of the two partitions.
+
+    Returns
+    -------
+    numpy.ndarray
+        Best Jaccard index of each row community, 0 for an empty row.
+    """
+    table = table.tocsr()
+    row_sizes = np.asarray(table.sum(axis=1)).ravel()
+    col_sizes = np.asarray(table.sum(axis=0)).ravel()
+    rows = np.repeat(np.arange(table.shape[0]), np.diff(table.indptr))
+    jaccard = table.data / (row_sizes[rows] + col_sizes[table.indices] - table.data)
+    best = np.zeros(table.shape[0])
+    # reduceat would give an empty row the maximum of the next one
+    non_empty = np.diff(table.indptr) > 0
+    if non_empty.any():
+        best[non_empty] = np.maximum.reduceat(jaccard, table.indptr[:-1][non_empty])
+    return best
+
+
+def compare_two_partitions(labels_a, labels_b):
+    """
+    Computes agreement metrics between two partitions of the same actors.
+
+    Parameters
+    ----------
+    labels_a : numpy.ndarray
+        Community labels of each actor in the first partition.
+    labels_b : numpy.ndarray
+        Community labels of each actor in the second partition.
+
+    Returns
+    -------
+    dict
+        - "NMI": normalized mutual information (arithmetic normalization).
+        - "ARI": adjusted Rand index.
+        - "VI": variation of information (in nats).
+        - "JaccardA": best-match Jaccard index of each community of the first
+          partition, in increasing label order (unused labels are skipped).
+        - "JaccardB": best-match Jaccard index of each community of the second partition.
+    """
+    # labels need not be contiguous, unused labels would be empty rows or columns
+    _, labels_a = np.unique(labels_a, return_inverse=True)
+    _, labels_b = np.unique(labels_b, return_inverse=True)
+    table = contingency_table(labels_a, labels_b)
+    n = labels_a.shape[0]
+    sizes_a = np.asarray(table.sum(axis=1)).ravel()
+    sizes_b = np.asarray(table.sum(axis=0)).ravel()
+
+    coo = table.tocoo()
+    n_ij = coo.data.astype(np.float64)
+    mutual_info = np.sum(
+        n_ij / n * np.log(n * n_ij / (sizes_a[coo.row] * sizes_b[coo.col]))
+    )
+    h_a = _entropy(sizes_a, n)
+    h_b = _entropy(sizes_b, n)
+    nmi = mutual_info / ((h_a + h_b) / 2) if h_a + h_b > 0 else 1.0
+    vi = h_a + h_b - 2 * mutual_info
+
+    sum_comb = _comb2(n_ij).sum()
+    sum_comb_a = _comb2(sizes_a).sum()
+    sum_comb_b = _comb2(sizes_b).sum()
+    expected = sum_comb_a * sum_comb_b / _comb2(np.array(n))
+    max_index = (sum_comb_a + sum_comb_b) / 2
+    ari = (sum_comb - expected) / (max_index - expected) if max_index != expected else 1.0
+
+    return {
+        "NMI": nmi,
+        "ARI": ari,
+        "VI": max(vi, 0.0),
+        "JaccardA": best_match_jaccard(table),
+        "JaccardB": best_match_jaccard(table.T),
+    }
+
+
+def _init_worker(labels):
+    global _worker_labels
+    _worker_labels = labels
+
+
+def _compare_pairs(pairs):
+    return [compare_two_partitions(_worker_labels[i], _worker_labels[j]) for i, j in pairs]
+
+
+def compare_partitions(labels, n_jobs=None, chunk_size=64):
+    """
+    Compares all pairs among N partitions of the same actors, e.g. Louvain runs
+    with different seeds.
+
+    Parameters
+    ----------
+    labels : numpy.ndarray
+        Label matrix of shape (N, number of actors), see `partitions_to_labels`.
+    n_jobs : int, optional
+        Number of worker processes. If 1, the pairs are compared in the current
+        process. Defaults to the number of CPUs.
+    chunk_size : int, optional
+        Number of pairs sent to a worker at once. Defaults to 64.
+
+    Returns
+    -------
+    tuple
+        - DataFrame with one row per pair and columns "PartitionA", "PartitionB",
+          "NMI", "ARI" and "VI".
+        - list of numpy.ndarray, the p-th array contains, for each community of
+          partition p (in increasing label order), its best-match Jaccard index
+          averaged over the other partitions.
+    """
+    labels = np.asarray(labels)
+    pairs = list(combinations(range(labels.shape[0]), 2))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+
+    if n_jobs == 1:
+        _init_worker(labels)
+        results = [result for chunk in chunks for result in _compare_pairs(chunk)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_worker, initargs=(labels,)
+        ) as executor:
+            results = [
+                result for chunk_results in executor.map(_compare_pairs, chunks)
+                for result in chunk_results
+            ]
+
+    stability = [np.zeros(len(np.unique(labels[p]))) for p in range(labels.shape[0])]
+    for (i, j), result in zip(pairs, results):
+        stability[i] += result["JaccardA"]
+        stability[j] += result["JaccardB"]
+    if labels.shape[0] > 1:
+        stability = [s / (labels.shape[0] - 1) for s in stability]
+
+    scores = pd.DataFrame(
+        {
+            "PartitionA": [i for i, _ in pairs],
+            "PartitionB": [j for _, j in pairs],
+            "NMI": [result["NMI"] for result in results],
+            "ARI": [result["ARI"] for result in results],
+            "VI": [result["VI"] for result in results],
+        }
+    )
+    return scores, stability
@@ -1,11 +1,20 @@
 from src.utils.helpers import read_communities
-from src.utils.networkx_helpers import katz_centrality, betweenness_centrality, closeness_centrality, importance
+from src.utils.networkx_helpers import katz_centrality, betweenness_centrality, closeness_centrality, importance, sparse_katz_centrality
 from src.utils.actors import ActorStats
+from src.utils.centrality import combined_importance
+from src.utils import csr_graph
+from src.utils.indexes import ActorIndex
+from src.utils.lazy import LazyModule
 
+from concurrent.futures import ProcessPoolExecutor
 
 import networkx as nx
 import numpy as np
-import matplotlib.pyplot as plt
+import pandas as pd
+
+plt = LazyModule("matplotlib.pyplot")
+
+KEY_ACTORS_COLUMNS = ["ClusterLabel", "Rank", "FreebaseActorId", "Betweenness", "Closeness", "Katz", "Importance"]
 
 
 def count_communities_list_occurences(communities_list, actor_l, actor_r):
@@ -150,14 +159,92 @@ def print_cluster_actor_info(G, characters, movies, cluster):
     importance(G_cluster, betweennness, closeness, katz)
 
 
+def _cluster_centralities(task):
+    label, nodes, edges, top_k = task
+    G_cluster = nx.Graph()
+    G_cluster.add_nodes_from(nodes)
+    G_cluster.add_edges_from(edges)
+    graph = csr_graph.CSRGraph.from_networkx(G_cluster)
+    scores = pd.DataFrame({
+        "Betweenness": csr_graph.betweenness_centrality(graph, n_jobs=1)["Betweenness"],
+        "Closeness": csr_graph.closeness_centrality(graph, n_jobs=1)["Closeness"],
+        "Katz": pd.Series(sparse_katz_centrality(G_cluster)),
+    })
+    # centralities are degenerate on a single node, a lone actor is the key actor of its cluster
+    scores["Importance"] = 1.0 if len(scores) == 1 else combined_importance(scores)
+    # rounding makes ties between equivalent actors independent of floating point noise
+    scores = scores.sort_values("Importance", ascending=False, kind="stable", key=lambda x: x.round(12)).head(top_k)
+    scores = scores.rename_axis("FreebaseActorId").reset_index()
+    scores.insert(0, "ClusterLabel", label)
+    scores.insert(1, "Rank", np.arange(1, len(scores) + 1))
+    return scores
+
+
+def clusters_key_actors(G, characters, movies, communities, top_k=5, n_jobs=None):
+    """
+    Finds the key actors of every community: the centralities used by
+    `print_cluster_actor_info` are computed on each cluster subgraph, the
+    clusters being processed largest first. Communities without any actor in
+    `G` have no key actors.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        Actors graph
+    characters : pd.DataFrame
+        Pre-processed table with characters metadata
+    movies : pd.DataFrame
+        Pre-processed table with movies metadata
+    communities : list of list
+        Partition of the actors, each community is a list of Freebase actor IDs
+    top_k : int, optional
+        Number of actors kept per cluster. Defaults to 5.
+    n_jobs : int, optional
+        Number of worker processes. Defaults to None, the clusters are then
+        processed in the current process.
+
+    Returns
+    -------
+    DataFrame
+        Columns "ClusterLabel" (index of the community), "Rank", "FreebaseActorId",
+        "ActorName", "Betweenness", "Closeness", "Katz" and "Importance"
+        (normalized within the cluster), sorted by cluster and rank.
+    """
+    order = sorted(range(len(communities)), key=lambda label: len(communities[label]), reverse=True)
+    tasks = []
+    for label in order:
+        G_cluster = G.subgraph(communities[label])
+        # centralities are not defined on an empty graph
+        if len(G_cluster) > 0:
+            tasks.append((label, list(G_cluster.nodes), list(G_cluster.edges), top_k))
+
+    if n_jobs is None or n_jobs == 1:
+        results = list(map(_cluster_centralities, tasks))
+    else:
+        # a few chunks per worker, so that the largest clusters sent first stay balanced
+        chunksize = max(1, len(tasks) // (4 * n_jobs))
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(_cluster_centralities, tasks, chunksize=chunksize))
+    if not results:
+        results = [pd.DataFrame(columns=KEY_ACTORS_COLUMNS)]
+
+    key_actors = pd.concat(results, ignore_index=True).sort_values(["ClusterLabel", "Rank"], ignore_index=True)
+    actor_index = ActorIndex(characters, movies)
+    codes = actor_index.codes(key_actors["FreebaseActorId"])
+    names = actor_index.actors["ActorName"].to_numpy()[codes]
+    key_actors.insert(3, "ActorName", np.where(codes >= 0, names, None))
+    return key_actors
+
+
 def get_top_movies_by_revenue(cluster, num_actors_in_movie):
     return cluster.cluster_movies(select_type="half", num_actors_in_movie=num_actors_in_movie).sort_values(by="Revenue", ascending=False)["MovieName"].head(10)
 
 
 def make_cluster_years_list(graph_stats, size_l, select_type, num_actors_in_movie=None):
+    table = graph_stats.table
+    membership = table.movie_membership(select_type, num_actors_in_movie)
+    years = table.movies["ReleaseDate"].apply(lambda x: int(x.year))
     cluster_years_list = []
-    for cluster in graph_stats.clusters:
-        cluster_years = cluster.cluster_movies(select_type=select_type, num_actors_in_movie=num_actors_in_movie)["ReleaseDate"].apply(lambda x: int(x.year))
-        if len(cluster_years) >= size_l:
-            cluster_years_list.append(cluster_years)
+    for label in np.flatnonzero(np.diff(membership.indptr) >= size_l):
+        cluster_years_list.append(years.iloc[table.cluster_movie_rows(membership, label)])
     return cluster_years_list
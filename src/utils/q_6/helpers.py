@@ -2,11 +2,13 @@ from src.utils.helpers import filter_by_genre
 from src.utils.helpers import filter_by_country, filter_by_genre, drop_nans, fix_date, filter_by_language, merge_movies_and_actors
 from src.data import load_movies, load_characters
 from src.awards.helpers import get_linreg_q3
+from src.utils.lazy import LazyModule
 
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+plt = LazyModule("matplotlib.pyplot")
+
 
 countries_langue = {
     'English': ('United States of America', 'English Language'),
@@ -0,0 +1,199 @@
+import numpy as np
+
+from src.utils.layout import cached_layout
+from src.utils.lazy import LazyModule
+
+mpl = LazyModule("matplotlib")
+mpl_colors = LazyModule("matplotlib.colors")
+mpl_image = LazyModule("matplotlib.image")
+
+
+def _to_pixels(positions, width, height, margin):
+    """Maps positions to (x, y) pixel coordinates, keeping the aspect ratio."""
+    low = positions.min(axis=0)
+    extent = max(np.ptp(positions, axis=0).max(), 1e-12)
+    usable = min(width, height) * (1 - 2 * margin)
+    offset = (np.array([width, height]) - usable * np.ptp(positions, axis=0) / extent) / 2
+    pixels = (positions - low) / extent * usable + offset
+    # the y axis of an image goes down
+    pixels[:, 1] = height - 1 - pixels[:, 1]
+    return np.clip(pixels, 0, [width - 1, height - 1])
+
+
+def _accumulate_edges(buffer, pixels, sources, targets, chunk_size):
+    """Adds one count per pixel crossed by each edge, in chunks of at most `chunk_size` samples."""
+    height, width = buffer.shape
+    start, end = pixels[sources], pixels[targets]
+    samples = np.ceil(np.abs(end - start).max(axis=1)).astype(np.int64) + 1
+    bounds = np.searchsorted(np.cumsum(samples), np.arange(chunk_size, samples.sum() + chunk_size, chunk_size))
+    flat = buffer.reshape(-1)
+    first = 0
+    for last in np.unique(np.append(bounds, len(samples))):
+        last = max(last, first + 1)
+        edges = slice(first, min(last, len(samples)))
+        lengths = samples[edges]
+        steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        t = steps / np.repeat(np.maximum(lengths - 1, 1), lengths)
+        points = np.repeat(start[edges], lengths, axis=0) + t[:, None] * np.repeat(end[edges] - start[edges], lengths, axis=0)
+        points = np.rint(points).astype(np.int64)
+        flat += np.bincount(points[:, 1] * width + points[:, 0], minlength=flat.size)
+        first = edges.stop
+        if first >= len(samples):
+            break
+
+
+def _disk_offsets(radius):
+    span = np.arange(-radius, radius + 1)
+    dx, dy = np.meshgrid(span, span)
+    keep = dx ** 2 + dy ** 2 <= radius ** 2
+    return np.stack([dx[keep], dy[keep]], axis=1)
+
+
+def _shade(density):
+    """Log density scaled to [0, 1]."""
+    density = np.log1p(density)
+    return density / density.max() if density.max() > 0 else density
+
+
+def render_raster(
+    positions,
+    sources,
+    targets,
+    output_path=None,
+    labels=None,
+    width=1920,
+    height=1080,
+    edge_color="#FF2E63",
+    node_color="#08D9D6",
+    background="#FFFFFF",
+    node_radius=1,
+    margin=0.02,
+    chunk_size=2_000_000,
+):
+    """
+    Rasterizes a graph into a pixel accumulation buffer instead of drawing
+    one matplotlib artist per edge. Edges are sampled at one point per pixel
+    and counted per pixel, the edge layer opacity follows the log of these
+    counts (density shading). Nodes are drawn on top, colored by community
+    when labels are given (mean color of the nodes in the pixel). The time is
+    linear in the total length of the edges and the memory is bounded by a
+    few image-sized buffers and `chunk_size` samples.
+
+    Parameters
+    ----------
+    positions : numpy.ndarray
+        Node positions of shape (n, 2)
+    sources, targets : numpy.ndarray
+        Node codes (rows of `positions`) of the edge endpoints
+    output_path : str, optional
+        Path of the PNG file to write.
+    labels : numpy.ndarray, optional
+        Community label of each node (-1 for no community), labels are
+        colored with the 'tab20' colormap in the order of the largest communities.
+    width, height : int, optional
+        Size of the image in pixels. Defaults to 1920 x 1080.
+    edge_color, node_color, background : str, optional
+        Colors; `node_color` is used when no labels are given.
+    node_radius : int, optional
+        Radius of the nodes in pixels. Defaults to 1.
+    margin : float, optional
+        Empty border, as a fraction of the image size. Defaults to 0.02.
+    chunk_size : int, optional
+        Maximum number of edge samples held in memory at once. Defaults to 2,000,000.
+
+    Returns
+    -------
+    numpy.ndarray
+        The RGB image, of shape (height, width, 3) with values in [0, 1].
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    image = np.empty((height, width, 3))
+    image[:] = mpl_colors.to_rgb(background)
+    if len(positions) == 0:
+        if output_path is not None:
+            mpl_image.imsave(output_path, image)
+        return image
+    pixels = _to_pixels(positions, width, height, margin)
+
+    edges = np.zeros((height, width))
+    if len(sources) > 0:
+        _accumulate_edges(edges, pixels, np.asarray(sources), np.asarray(targets), chunk_size)
+    alpha = _shade(edges)[..., None]
+    image = image * (1 - alpha) + np.array(mpl_colors.to_rgb(edge_color)) * alpha
+
+    if labels is None:
+        node_colors = np.tile(mpl_colors.to_rgb(node_color), (len(positions), 1))
+    else:
+        labels = np.asarray(labels)
+        known = labels >= 0
+        # colors go to the largest communities first
+        ranks = np.zeros(len(labels), dtype=np.int64)
+        if known.any():
+            counts = np.bincount(labels[known])
+            order = np.argsort(-counts, kind="stable")
+            rank_of = np.empty(len(counts), dtype=np.int64)
+            rank_of[order] = np.arange(len(counts))
+            ranks[known] = rank_of[labels[known]]
+        palette = np.array(mpl.colormaps["tab20"].colors)
+        node_colors = palette[ranks % len(palette)]
+        node_colors[~known] = mpl_colors.to_rgb(node_color)
+
+    counts = np.zeros(height * width)
+    color_sums = np.zeros((height * width, 3))
+    centers = np.rint(pixels).astype(np.int64)
+    for offset in _disk_offsets(node_radius):
+        points = centers + offset
+        inside = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+        flat = points[inside, 1] * width + points[inside, 0]
+        counts += np.bincount(flat, minlength=counts.size)
+        for channel in range(3):
+            color_sums[:, channel] += np.bincount(flat, weights=node_colors[inside, channel], minlength=counts.size)
+
+    covered = counts > 0
+    node_alpha = np.zeros(height * width)
+    # a single node stays visible, denser pixels get more opaque
+    node_alpha[covered] = 0.5 + 0.5 * _shade(counts)[covered]
+    colors = np.zeros((height * width, 3))
+    colors[covered] = color_sums[covered] / counts[covered, None]
+    node_alpha = node_alpha.reshape(height, width, 1)
+    image = image * (1 - node_alpha) + colors.reshape(height, width, 3) * node_alpha
+
+    if output_path is not None:
+        mpl_image.imsave(output_path, np.clip(image, 0, 1))
+    return image
+
+
+def render_graph_raster(G, output_path, communities=None, pos=None, **kwargs):
+    """
+    Rasterizes a networkx graph to a PNG file, see `render_raster`.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        The graph
+    output_path : str
+        Path of the PNG file to write.
+    communities : list of list, optional
+        Partition of the nodes, used to color them.
+    pos : dict, optional
+        Position of each node. Defaults to the force-directed layout `layout.cached_layout`.
+    **kwargs
+        Other parameters of `render_raster`.
+
+    Returns
+    -------
+    numpy.ndarray
+        The RGB image.
+    """
+    nodes = list(G.nodes)
+    codes = {node: code for code, node in enumerate(nodes)}
+    pos = cached_layout(G) if pos is None else pos
+    positions = np.array([pos[node] for node in nodes]).reshape(-1, 2)
+    edges = np.array([(codes[u], codes[v]) for u, v in G.edges], dtype=np.int64).reshape(-1, 2)
+
+    labels = None
+    if communities is not None:
+        labels = np.full(len(nodes), -1, dtype=np.int64)
+        for label, community in enumerate(communities):
+            labels[[codes[node] for node in community if node in codes]] = label
+    return render_raster(positions, edges[:, 0], edges[:, 1], output_path, labels=labels, **kwargs)
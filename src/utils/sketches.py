@@ -0,0 +1,143 @@
+import numpy as np
+
+
+class KLLSketch:
+    """
+    Mergeable quantile summary (KLL sketch) with bounded memory.
+
+    Values are stored in compactors, the items of level h have weight 2^h.
+    When a level exceeds its capacity, its items are sorted and every other
+    item (random offset) is promoted to the next level. Each such compaction
+    changes the rank of any value by at most the weight of the level, which
+    gives the error bound reported by `rank_error`.
+    """
+
+    def __init__(self, k=200, seed=None):
+        """
+        Creates an empty KLLSketch.
+
+        Parameters
+        ----------
+        k : int, optional
+            Capacity of the top level, memory is O(k log(n / k)). Defaults to 200.
+        seed : int, optional
+            Seed of the random offsets used by compactions.
+        """
+        self.k = k
+        self.n = 0
+        self.compactors = [[]]
+        self._rank_error = 0
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.n
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.compactors):
+            if len(self.compactors[level]) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.compactors):
+                self.compactors.append([])
+            items = sorted(self.compactors[level])
+            # with an odd number of items, the largest one stays at this level
+            kept = items[-1:] if len(items) % 2 else []
+            items = items[:len(items) - len(kept)]
+            self.compactors[level + 1].extend(items[self._rng.integers(2)::2])
+            self.compactors[level] = kept
+            self._rank_error += 2 ** level
+            level = 0
+
+    def update(self, value):
+        """Adds one value to the sketch."""
+        self.compactors[0].append(value)
+        self.n += 1
+        self._compress()
+
+    def update_many(self, values):
+        """Adds several values to the sketch."""
+        values = list(values)
+        self.compactors[0].extend(values)
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other):
+        """
+        Adds all the values summarized by another sketch, e.g. when two clusters
+        are merged. The error bounds of both sketches add up.
+
+        Parameters
+        ----------
+        other : KLLSketch
+            Sketch to merge into this one, it is not modified.
+
+        Returns
+        -------
+        KLLSketch
+            This sketch.
+        """
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.n += other.n
+        self._rank_error += other._rank_error
+        self._compress()
+        return self
+
+    def is_exact(self):
+        """True if no compaction happened, i.e. all the values are still stored."""
+        return self._rank_error == 0
+
+    def rank_error(self):
+        """
+        Gets an upper bound on the error of the quantiles, as a fraction of the
+        number of values: the returned value of `quantile(q)` has a true rank
+        between (q - error) * n and (q + error) * n.
+
+        Returns
+        -------
+        float
+            The normalized rank error, 0 if the sketch is exact.
+        """
+        if self.is_exact():
+            return 0.0
+        # compaction errors plus the weight of one item of the top level
+        return (self._rank_error + 2 ** (len(self.compactors) - 1)) / self.n
+
+    def quantile(self, q):
+        """
+        Gets an approximate quantile of the summarized values. If the sketch is
+        exact, the result is the same as `np.quantile` (and pandas).
+
+        Parameters
+        ----------
+        q : float
+            Quantile to compute, between 0 and 1.
+
+        Returns
+        -------
+        float
+            The quantile, NaN if the sketch is empty.
+        """
+        if self.n == 0:
+            return np.nan
+        if self.is_exact():
+            return float(np.quantile(self.compactors[0], q))
+        items = np.concatenate([np.asarray(items, dtype=np.float64) for items in self.compactors])
+        weights = np.concatenate(
+            [np.full(len(items), 2 ** level) for level, items in enumerate(self.compactors)]
+        )
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        position = min(np.searchsorted(cumulative, q * self.n), len(order) - 1)
+        return float(items[order][position])
+
+    def median(self):
+        """Gets the approximate median of the summarized values."""
+        return self.quantile(0.5)
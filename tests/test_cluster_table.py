@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.cluster_table import ClusterTable
+
+
+def make_table(n_movies=400, n_actors=30, n_clusters=3, seed=0):
+    rng = np.random.default_rng(seed)
+    movies = pd.DataFrame({
+        "WikipediaId": np.arange(n_movies),
+        "Revenue": rng.integers(1, 10**6, size=n_movies).astype(float),
+    })
+    roles = [(movie, actor) for movie in range(n_movies) for actor in rng.choice(n_actors, size=3, replace=False)]
+    characters = pd.DataFrame({
+        "WikipediaId": [movie for movie, _ in roles],
+        "FreebaseActorId": [f"a{actor}" for _, actor in roles],
+    })
+    communities = [[f"a{actor}" for actor in range(label, n_actors, n_clusters)] for label in range(n_clusters)]
+    return ClusterTable(characters, movies, communities)
+
+
+def exact_medians(table):
+    return [
+        table.cluster_frame(label).groupby("FreebaseActorId").Revenue.median().median()
+        for label in range(len(table))
+    ]
+
+
+def test_median_revenue_sketches_are_exact_for_large_k():
+    table = make_table()
+    medians = [sketch.median() for sketch in table.median_revenue_sketches(k=1000)]
+    assert np.allclose(medians, exact_medians(table))
+    assert (table.median_revenue_rank_errors(k=1000).to_numpy() == 0).all()
+
+
+def test_median_revenue_sketches_stream_chunks_within_rank_error():
+    table = make_table()
+    actor_sketches = table.actor_revenue_sketches(k=8, chunk_size=50)
+    errors = table.median_revenue_rank_errors(k=8)
+    assert (errors["ActorRankError"] > 0).all()
+
+    for label, sketches in enumerate(actor_sketches):
+        revenues = table.cluster_frame(label).groupby("FreebaseActorId").Revenue
+        # every role of an actor is summarized, whatever the chunk it was read from
+        assert {actor_id: len(sketch) for actor_id, sketch in sketches.items()} == revenues.size().to_dict()
+        for actor_id, sketch in sketches.items():
+            values = np.sort(revenues.get_group(actor_id).to_numpy())
+            rank = np.searchsorted(values, sketch.median(), side="right")
+            assert abs(rank - len(values) / 2) <= sketch.rank_error() * len(values) + 1
+
+
+def test_movie_membership_keeps_one_matrix_per_select_type():
+    table = make_table()
+    cast_sizes = table.characters.groupby("WikipediaId").size()
+    half = table.movie_membership("half", cast_sizes)
+    assert table.movie_membership("half", cast_sizes) is half
+
+    # other cast sizes replace the cached matrix instead of adding one
+    larger = cast_sizes * 2
+    assert table.movie_membership("half", larger).nnz < half.nnz
+    assert len(table._memberships) == 1
+    assert table.movie_membership("half", cast_sizes) is not half
+    assert (table.movie_membership("half", cast_sizes) != half).nnz == 0
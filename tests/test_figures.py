@@ -0,0 +1,16 @@
+from src.utils.figures import FigureSpec, figure_hash
+
+
+def test_figure_hash_changes_with_the_drawing_code():
+    def draw(values):
+        return [value * 2 for value in values]
+
+    before = figure_hash(FigureSpec("figure", draw, ([1, 2],)))
+    assert figure_hash(FigureSpec("figure", draw, ([1, 2],))) == before
+    assert figure_hash(FigureSpec("figure", draw, ([1, 3],))) != before
+
+    # same name and data, the comprehension nested in the function is edited
+    def draw(values):
+        return [value * 3 for value in values]
+
+    assert figure_hash(FigureSpec("figure", draw, ([1, 2],))) != before
@@ -0,0 +1,14 @@
+import pytest
+
+from src.scripts.import_times import MODULES, THRESHOLD, measure_import
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_time_and_lazy_dependencies(module):
+    # best of two fresh interpreters, the first one may pay for a cold disk cache
+    measures = [measure_import(module) for _ in range(2)]
+    seconds = min(measure["seconds"] for measure in measures)
+    assert seconds <= THRESHOLD, f"importing {module} took {seconds:.3f}s"
+    # names of LAZY_DEPENDENCIES found in sys.modules after the import
+    loaded = measures[0]["loaded"]
+    assert not loaded, f"importing {module} loads {', '.join(loaded)}"
@@ -0,0 +1,43 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from src.utils.q_4_5.helpers import clusters_key_actors
+
+
+def test_single_actor_communities_have_defined_importance():
+    G = nx.Graph([("a", "b"), ("b", "c"), ("c", "a"), ("c", "d")])
+    G.add_nodes_from(["e", "f"])
+    communities = [["e"], ["a", "b", "c", "d"], ["f"]]
+    characters = pd.DataFrame({
+        "WikipediaId": [1, 1, 1, 1, 2, 3],
+        "FreebaseActorId": ["a", "b", "c", "d", "e", "f"],
+        "ActorName": ["A", "B", "C", "D", "E", "F"],
+    })
+    movies = pd.DataFrame({"WikipediaId": [1, 2, 3]})
+
+    key_actors = clusters_key_actors(G, characters, movies, communities, top_k=2, n_jobs=1)
+    assert not key_actors["Importance"].isna().any()
+    singles = key_actors[key_actors["ClusterLabel"].isin([0, 2])]
+    assert singles["FreebaseActorId"].tolist() == ["e", "f"]
+    assert np.allclose(singles["Importance"], 1.0)
+    assert singles["Rank"].tolist() == [1, 1]
+    assert key_actors[key_actors["ClusterLabel"] == 1]["FreebaseActorId"].iloc[0] == "c"
+
+
+def test_communities_missing_from_graph_have_no_key_actors():
+    G = nx.Graph([("a", "b"), ("b", "c")])
+    characters = pd.DataFrame({
+        "WikipediaId": [1, 1, 1, 2],
+        "FreebaseActorId": ["a", "b", "c", "x"],
+        "ActorName": ["A", "B", "C", "X"],
+    })
+    movies = pd.DataFrame({"WikipediaId": [1, 2]})
+
+    key_actors = clusters_key_actors(G, characters, movies, [["x", "y"], ["a", "b", "c"]], top_k=2)
+    assert key_actors["ClusterLabel"].tolist() == [1, 1]
+    assert key_actors["FreebaseActorId"].tolist() == ["b", "a"]
+
+    key_actors = clusters_key_actors(G, characters, movies, [["x"], []])
+    assert key_actors.empty
+    assert "ActorName" in key_actors.columns
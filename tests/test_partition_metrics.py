@@ -0,0 +1,22 @@
+import numpy as np
+
+from src.utils.partition_metrics import compare_partitions, compare_two_partitions
+
+
+def test_gapped_labels_match_contiguous_labels():
+    gapped = compare_two_partitions(np.array([0, 0, 2, 2, 5]), np.array([1, 1, 1, 3, 3]))
+    contiguous = compare_two_partitions(np.array([0, 0, 1, 1, 2]), np.array([0, 0, 0, 1, 1]))
+    for key in ("NMI", "ARI", "VI"):
+        assert np.isclose(gapped[key], contiguous[key])
+    np.testing.assert_allclose(gapped["JaccardA"], [2 / 3, 1 / 3, 1 / 2])
+    np.testing.assert_allclose(gapped["JaccardA"], contiguous["JaccardA"])
+    np.testing.assert_allclose(gapped["JaccardB"], contiguous["JaccardB"])
+
+
+def test_identical_gapped_partitions_have_perfect_jaccard():
+    labels = np.array([[0, 0, 2, 2], [4, 4, 1, 1]])
+    scores, stability = compare_partitions(labels, n_jobs=1)
+    assert np.isclose(scores["NMI"].iloc[0], 1.0)
+    assert np.isclose(scores["ARI"].iloc[0], 1.0)
+    for jaccard in stability:
+        np.testing.assert_allclose(jaccard, [1.0, 1.0])
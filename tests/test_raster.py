@@ -0,0 +1,17 @@
+import networkx as nx
+import numpy as np
+
+from src.utils.raster import render_graph_raster
+
+
+def test_render_graph_raster_with_communities(tmp_path):
+    G = nx.les_miserables_graph()
+    nodes = list(G.nodes)
+    communities = [nodes[:30], nodes[30:60]]  # the other nodes have no community
+    path = tmp_path / "graph.png"
+    image = render_graph_raster(
+        G, str(path), communities=communities, pos=nx.spring_layout(G, seed=1), width=64, height=48
+    )
+    assert image.shape == (48, 64, 3)
+    assert np.all((image >= 0) & (image <= 1))
+    assert path.exists()